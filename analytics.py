@@ -0,0 +1,164 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy import select
+
+# Columns held in memory; titles and URLs stay in the database and are only
+# fetched for the handful of rows an endpoint returns.
+SNAPSHOT_COLUMNS = (
+    'id', 'keyword', 'user_unique_id', 'user_nickname',
+    'play_count', 'comment_count', 'share_count', 'create_time',
+)
+CATEGORY_COLUMNS = ('keyword', 'user_unique_id', 'user_nickname')
+COUNT_COLUMNS = ('play_count', 'comment_count', 'share_count')
+
+DEFAULT_PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+
+
+def engagement_columns(frame):
+    """Add engagement_rate (percent) and is_shareable, same rules as scraping, for every row at once."""
+    plays = frame['play_count'].to_numpy(dtype='float64')
+    interactions = (frame['comment_count'] + frame['share_count']).to_numpy(dtype='float64')
+    rate = np.divide(interactions, plays, out=np.zeros_like(plays), where=plays > 0)
+    frame['engagement_rate'] = np.round(rate * 100, 2).astype('float32')
+    frame['is_shareable'] = (rate > 0.005) | (plays > 100000)
+    return frame
+
+
+def _prepare(chunk):
+    # Compact dtypes so millions of rows fit in one worker
+    for column in COUNT_COLUMNS:
+        chunk[column] = chunk[column].fillna(0).astype('int64')
+    for column in CATEGORY_COLUMNS:
+        chunk[column] = chunk[column].astype('category')
+    chunk['id'] = chunk['id'].astype('int64')
+    chunk['create_time'] = pd.to_datetime(chunk['create_time'])
+    return engagement_columns(chunk)
+
+
+def _empty_frame():
+    return _prepare(pd.DataFrame({column: pd.Series(dtype='object') for column in SNAPSHOT_COLUMNS}))
+
+
+def _concat(frames):
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return _empty_frame()
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    combined = pd.concat(frames, ignore_index=True)
+    # Plain concat turns categoricals with different categories into objects
+    for column in CATEGORY_COLUMNS:
+        combined[column] = union_categoricals([frame[column] for frame in frames])
+    return combined
+
+
+class PostSnapshot:
+    """In-memory columnar copy of the post table for analytics.
+
+    :meth:`refresh` only reads rows with an id above the highest one already
+    loaded, plus rows marked as updated with :meth:`mark_updated`.  A full
+    reload happens every ``max_age`` seconds so metric updates made by other
+    processes show up eventually.
+    """
+
+    def __init__(self, table, chunk_size=50000, max_age=3600):
+        self.table = table
+        self.chunk_size = chunk_size
+        self.max_age = max_age
+        self.frame = _empty_frame()
+        self.max_id = 0
+        # -inf rather than 0: monotonic() may be smaller than max_age shortly after boot
+        self.loaded_at = float('-inf')
+        self.updated_video_ids = set()
+        self.lock = threading.Lock()
+
+    def expire(self):
+        # Force a full reload on the next refresh
+        with self.lock:
+            self.loaded_at = float('-inf')
+
+    def mark_updated(self, video_ids):
+        with self.lock:
+            self.updated_video_ids.update(video_ids)
+
+    def _read(self, connection, query):
+        # Server-side cursor where the driver supports it, consumed in chunks
+        connection = connection.execution_options(stream_results=True)
+        chunks = pd.read_sql(query, connection, chunksize=self.chunk_size)
+        return _concat([_prepare(chunk) for chunk in chunks])
+
+    def refresh(self, engine):
+        columns = [self.table.c[column] for column in SNAPSHOT_COLUMNS]
+        with self.lock, engine.connect() as connection:
+            if time.monotonic() - self.loaded_at > self.max_age:
+                self.frame = self._read(connection, select(*columns).order_by(self.table.c.id))
+                self.loaded_at = time.monotonic()
+                self.updated_video_ids.clear()
+            else:
+                frames = [self.frame]
+                if self.updated_video_ids:
+                    updated = self._read(connection, select(*columns).where(
+                        self.table.c.video_id.in_(list(self.updated_video_ids))
+                    ))
+                    frames = [self.frame[~self.frame['id'].isin(updated['id'])], updated]
+                    self.updated_video_ids.clear()
+                frames.append(self._read(connection, select(*columns).where(
+                    self.table.c.id > self.max_id
+                ).order_by(self.table.c.id)))
+                # A row can be both marked as updated and above the watermark; keep one copy
+                self.frame = _concat(frames).drop_duplicates('id', keep='last', ignore_index=True)
+
+            if len(self.frame):
+                self.max_id = int(self.frame['id'].max())
+            return self.frame
+
+
+def filter_keyword(frame, keyword):
+    if keyword and keyword != 'all':
+        return frame[frame['keyword'] == keyword]
+    return frame
+
+
+def engagement_percentiles(frame, by, percentiles=DEFAULT_PERCENTILES, min_posts=1):
+    """Engagement rate percentiles, mean and post count per value of ``by``."""
+    grouped = frame.groupby(by, observed=True)['engagement_rate']
+    stats = grouped.quantile(list(percentiles)).unstack()
+    stats.columns = [f"p{int(p * 100)}" for p in stats.columns]
+    stats['mean'] = grouped.mean()
+    stats['posts'] = grouped.size()
+    stats = stats[stats['posts'] >= min_posts].sort_values('posts', ascending=False)
+    return stats.round(2).reset_index()
+
+
+def top_shareable(frame, n=10):
+    """The ``n`` shareable posts with the highest engagement, ties broken by plays."""
+    return frame[frame['is_shareable']].nlargest(n, ['engagement_rate', 'play_count'])
+
+
+def growth_trends(frame, freq='M'):
+    """Posts, plays and mean engagement per period, with period-over-period growth in percent."""
+    dated = frame[frame['create_time'].notna()]
+    periods = dated['create_time'].dt.to_period(freq)
+    trends = dated.groupby(periods).agg(
+        posts=('id', 'size'),
+        plays=('play_count', 'sum'),
+        mean_engagement=('engagement_rate', 'mean'),
+    )
+    trends['posts_growth'] = trends['posts'].pct_change() * 100
+    trends['plays_growth'] = trends['plays'].pct_change() * 100
+    trends = trends.replace([np.inf, -np.inf], np.nan).round(2)
+    trends.index = trends.index.astype(str)
+    return trends.rename_axis('period').reset_index()
+
+
+def to_records(frame):
+    """DataFrame rows as JSON-ready dicts (NaN becomes None, numpy scalars become Python ones)."""
+    return [
+        {key: (None if pd.isna(value) else value.item() if hasattr(value, 'item') else value)
+         for key, value in row.items()}
+        for row in frame.to_dict('records')
+    ]
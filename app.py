@@ -1,12 +1,35 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, make_response, Response, stream_with_context, g, has_request_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-import requests
-from datetime import datetime
-from sqlalchemy import func, extract
+import click
+from datetime import datetime, timedelta
+import math
+from collections import Counter
+from sqlalchemy import func, extract, and_, or_, event
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 import os
+import re
+import io
+import csv
+import base64
+import json
+import time
+import functools
+import threading
+import hashlib
+import tempfile
+from urllib.parse import urlencode
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 from dotenv import load_dotenv
+from tiktok_client import TikTokClient, UpstreamError
+from response_cache import make_cache
+from bloom import BloomFilter
+import analytics
+from metrics import Registry
 
 # environment variables
 load_dotenv()
@@ -17,10 +40,102 @@ CORS(app)
 # Database Configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DB_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['INGEST_CHUNK_SIZE'] = int(os.getenv('INGEST_CHUNK_SIZE', 500))
+app.config['POST_COUNT_TTL'] = int(os.getenv('POST_COUNT_TTL', 60))
+app.config['POST_COUNT_ESTIMATE_THRESHOLD'] = int(os.getenv('POST_COUNT_ESTIMATE_THRESHOLD', 100000))
+app.config['EXPORT_BATCH_SIZE'] = int(os.getenv('EXPORT_BATCH_SIZE', 1000))  # rows per fetch while exporting
+
+# Read endpoint cache: in-process by default, set RESPONSE_CACHE_PATH to share one SQLite file across workers
+app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', 300))  # seconds, 0 disables
+app.config['RESPONSE_CACHE_SIZE'] = int(os.getenv('RESPONSE_CACHE_SIZE', 256))
+app.config['RESPONSE_CACHE_PATH'] = os.getenv('RESPONSE_CACHE_PATH')
+
+# Analytics snapshot of the post table
+app.config['ANALYTICS_CHUNK_SIZE'] = int(os.getenv('ANALYTICS_CHUNK_SIZE', 50000))  # rows per read
+app.config['ANALYTICS_SNAPSHOT_MAX_AGE'] = int(os.getenv('ANALYTICS_SNAPSHOT_MAX_AGE', 3600))  # seconds between full reloads
+
+# Instrumentation: requests slower than this are logged with their slowest SQL statements (0 disables)
+app.config['SLOW_REQUEST_MS'] = int(os.getenv('SLOW_REQUEST_MS', 1000))
+
+# Upstream (RapidAPI) Configuration
+app.config['RAPIDAPI_HOST'] = os.getenv('RAPIDAPI_HOST', 'tiktok-video-no-watermark2.p.rapidapi.com')
+app.config['RAPIDAPI_BASE_URL'] = os.getenv('RAPIDAPI_BASE_URL', f"https://{app.config['RAPIDAPI_HOST']}")
+app.config['RAPIDAPI_RATE_LIMIT'] = float(os.getenv('RAPIDAPI_RATE_LIMIT', 5))  # requests per second, 0 disables
+app.config['SCRAPE_WORKERS'] = int(os.getenv('SCRAPE_WORKERS', 4))
+app.config['SCRAPE_MAX_RETRIES'] = int(os.getenv('SCRAPE_MAX_RETRIES', 3))
+app.config['CRAWL_SEEN_CAPACITY'] = int(os.getenv('CRAWL_SEEN_CAPACITY', 100000))  # video_ids remembered per keyword
+
+# Background scrape jobs
+app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))  # per process, 0 disables the workers
+app.config['JOB_POLL_INTERVAL'] = float(os.getenv('JOB_POLL_INTERVAL', 5))
+app.config['JOB_STALE_AFTER'] = int(os.getenv('JOB_STALE_AFTER', 300))  # requeue running jobs without a heartbeat
+app.config['TRACKED_KEYWORDS'] = [k.strip() for k in os.getenv('TRACKED_KEYWORDS', '').split(',') if k.strip()]
+app.config['RECRAWL_INTERVAL'] = int(os.getenv('RECRAWL_INTERVAL', 3600))  # seconds between scheduled crawls
+# Only the process holding this file lock schedules re-crawls
+app.config['RECRAWL_LOCK_PATH'] = os.getenv('RECRAWL_LOCK_PATH', os.path.join(tempfile.gettempdir(), 'tiktok-recrawl.lock'))
 
 # Initialize DB
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# The SQLite full-text index (post_fts and its shadow tables) lives outside the models
+migrate = Migrate(app, db, include_object=lambda obj, name, type_, reflected, compare_to: not (
+    type_ == 'table' and name.startswith('post_fts')
+))
+
+# Metrics exposed on /metrics, per process
+metrics = Registry()
+request_latency = metrics.histogram(
+    'http_request_duration_seconds', 'Time to build the response, by endpoint.')
+request_sql_statements = metrics.histogram(
+    'http_request_sql_statements', 'SQL statements executed per request, by endpoint.',
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000))
+request_sql_seconds = metrics.histogram(
+    'http_request_sql_duration_seconds', 'Time spent in SQL per request, by endpoint.')
+sql_statements_total = metrics.counter(
+    'sql_statements_total', 'SQL statements executed, including background jobs.')
+upstream_latency = metrics.histogram(
+    'upstream_request_duration_seconds', 'RapidAPI request latency, by response status.')
+upstream_retries_total = metrics.counter(
+    'upstream_retries_total', 'RapidAPI requests retried, by response status.')
+
+response_cache = make_cache(
+    app.config['RESPONSE_CACHE_PATH'],
+    maxsize=app.config['RESPONSE_CACHE_SIZE'],
+    ttl=app.config['RESPONSE_CACHE_TTL'],
+)
+
+def cached_response(view):
+    """Cache a read endpoint's JSON by path and query args, and answer with ETags.
+
+    Entries are tagged with the ``keyword`` arg (``'*'`` when unfiltered) so
+    :func:`save_posts` can drop the ones it makes stale.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.path + '?' + urlencode(sorted(request.args.items(multi=True)))
+        keyword = request.args.get('keyword')
+        tag = keyword if keyword and keyword != 'all' else '*'
+
+        hit = response_cache.get(key)
+        if hit is not None:
+            etag, body = hit
+            response = app.response_class(body, mimetype='application/json')
+            response.set_etag(etag)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            etag = hashlib.sha1(body).hexdigest()
+            response.set_etag(etag)
+            response_cache.set(key, tag, etag, body)
+
+        # Browsers revalidate every time and get a 304 while the data is unchanged
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    return wrapper
+
+def invalidate_cached_responses(keywords):
+    response_cache.invalidate({keyword for keyword in keywords if keyword} | {'*'})
 
 # Post model
 class Post(db.Model):
@@ -50,176 +165,1032 @@ class Post(db.Model):
     user_avatar = db.Column(db.Text)
     keyword = db.Column(db.Text)
 
+    # Serve the (create_time, id) ordering of /api/posts, alone or behind its filters.
+    # Existing databases get them (and full-text search on title) from `flask db upgrade`
+    __table_args__ = (
+        db.Index('ix_post_create_time_id', 'create_time', 'id'),
+        db.Index('ix_post_keyword_create_time', 'keyword', 'create_time', 'id'),
+        db.Index('ix_post_is_shareable_create_time', 'is_shareable', 'create_time', 'id'),
+        db.Index('ix_post_user_unique_id', 'user_unique_id'),
+        db.Index('ix_post_user_nickname', 'user_nickname'),
+        db.Index('ix_post_region', 'region'),
+    )
+
     def __repr__(self):
         return f"<Post {self.video_id}>"
 
+# Post counts per (keyword, year, month), maintained by save_posts() on every insert
+class MonthlyStat(db.Model):
+    __tablename__ = 'monthly_stat'
+    keyword = db.Column(db.Text, primary_key=True)  # '' for posts saved without a keyword
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<MonthlyStat {self.keyword} {self.year}-{self.month:02d}: {self.count}>"
+
+# Background scrape job; the row is the queue entry and the progress report
+class ScrapeJob(db.Model):
+    __tablename__ = 'scrape_job'
+    id = db.Column(db.Integer, primary_key=True)
+    keyword = db.Column(db.Text, nullable=False, index=True)
+    limit = db.Column(db.Integer, default=30)
+    max_posts = db.Column(db.Integer, default=200)
+    save_to_db = db.Column(db.Boolean, default=False)
+    update_existing = db.Column(db.Boolean, default=False)
+    delta = db.Column(db.Boolean, default=False)
+    status = db.Column(db.Text, nullable=False, default='queued', index=True)  # queued, running, done, failed
+    pages_fetched = db.Column(db.Integer, default=0)
+    posts_fetched = db.Column(db.Integer, default=0)
+    posts_saved = db.Column(db.Integer, default=0)
+    posts_skipped = db.Column(db.Integer, default=0)
+    errors = db.Column(db.JSON, default=list)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)  # heartbeat while running
+    finished_at = db.Column(db.DateTime)
+
+    # At most one queued or running job per keyword, however many processes enqueue
+    __table_args__ = (
+        db.Index('uq_scrape_job_active_keyword', 'keyword', unique=True,
+                 postgresql_where=db.text("status IN ('queued', 'running')"),
+                 sqlite_where=db.text("status IN ('queued', 'running')")),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "keyword": self.keyword,
+            "limit": self.limit,
+            "max_posts": self.max_posts,
+            "save_to_db": self.save_to_db,
+            "update_existing": self.update_existing,
+            "delta": self.delta,
+            "status": self.status,
+            "pages_fetched": self.pages_fetched,
+            "posts_fetched": self.posts_fetched,
+            "posts_saved": self.posts_saved,
+            "posts_skipped": self.posts_skipped,
+            "errors": self.errors or [],
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<ScrapeJob {self.id} {self.keyword} {self.status}>"
+
+# Per-keyword high-water marks for delta crawls
+class CrawlState(db.Model):
+    __tablename__ = 'crawl_state'
+    keyword = db.Column(db.Text, primary_key=True)
+    last_cursor = db.Column(db.Integer)
+    newest_create_time = db.Column(db.DateTime)
+    seen_video_ids = db.Column(db.LargeBinary)  # serialized BloomFilter of recently saved video_ids
+    updated_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<CrawlState {self.keyword} cursor={self.last_cursor}>"
+
+post_snapshot = analytics.PostSnapshot(
+    Post.__table__,
+    chunk_size=app.config['ANALYTICS_CHUNK_SIZE'],
+    max_age=app.config['ANALYTICS_SNAPSHOT_MAX_AGE'],
+)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # A connection runs one statement at a time, so one start time per connection is enough
+    conn.info['query_started'] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop('query_started')
+    sql_statements_total.inc()
+    if has_request_context():
+        g.sql_count = g.get('sql_count', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+        # Keep the slowest few for the slow-request log
+        slowest = g.setdefault('sql_slowest', [])
+        slowest.append((elapsed, statement))
+        if len(slowest) > 10:
+            slowest.sort(key=lambda item: item[0], reverse=True)
+            del slowest[5:]
+
 with app.app_context():
     db.create_all()
+    event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
     print("✅ Database tables created successfully!")
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_latency.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    request_sql_statements.observe(g.get('sql_count', 0), endpoint=endpoint)
+    request_sql_seconds.observe(g.get('sql_seconds', 0.0), endpoint=endpoint)
+
+    slow_ms = app.config['SLOW_REQUEST_MS']
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        slowest = sorted(g.get('sql_slowest', []), key=lambda item: item[0], reverse=True)[:5]
+        queries = ''.join(f"\n  {seconds * 1000:.1f}ms {' '.join(statement.split())[:500]}" for seconds, statement in slowest)
+        app.logger.warning(
+            "Slow request %s %s: %.0fms, %d SQL statements in %.0fms%s",
+            request.method, request.full_path, elapsed * 1000,
+            g.get('sql_count', 0), g.get('sql_seconds', 0.0) * 1000, queries,
+        )
+    return response
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def home():
     return render_template('index.html')
 
+def get_tiktok_client():
+    # One client per process so the keep-alive session and rate limit are shared
+    client = app.extensions.get('tiktok_client')
+    if client is None:
+        client = TikTokClient(
+            app.config['RAPIDAPI_BASE_URL'],
+            api_key=os.getenv('RAPIDAPI_KEY'),
+            api_host=app.config['RAPIDAPI_HOST'],
+            max_workers=app.config['SCRAPE_WORKERS'],
+            rate_limit=app.config['RAPIDAPI_RATE_LIMIT'],
+            max_retries=app.config['SCRAPE_MAX_RETRIES'],
+            on_request=lambda seconds, status: upstream_latency.observe(seconds, status=status),
+            on_retry=lambda status: upstream_retries_total.inc(status=status),
+        )
+        app.extensions['tiktok_client'] = client
+    return client
+
+def build_post(video, search_keyword):
+    # Calculate if post is shareable based on engagement metrics
+    play_count = video.get('play_count', 0)
+    comment_count = video.get('comment_count', 0)
+    share_count = video.get('share_count', 0)
+
+    # Prevent division by zero
+    engagement_rate = 0
+    if play_count > 0:
+        engagement_rate = (comment_count + share_count) / play_count
+
+    # A post is considered shareable if:
+    # 1. It has high engagement rate (>0.5%) OR
+    # 2. It has very high view count (>100000)
+    is_shareable = (engagement_rate > 0.005) or (play_count > 100000)
+
+    return {
+        "video_id": video.get('video_id'),
+        "region": video.get('region'),
+        "title": video.get('title'),
+        "cover_photo": video.get('cover'),
+        "ai_dynamic_cover_photo": video.get('ai_dynamic_cover'),
+        "duration": video.get('duration', 0),
+        "video_link": video.get('video_link'),
+        "size": video.get('size', 0),
+        "play_count": play_count,
+        "comment_count": comment_count,
+        "share_count": share_count,
+        "create_time": datetime.utcfromtimestamp(video.get('create_time', 0)) if video.get('create_time') else None,
+        "download_count": video.get('download_count', 0),
+        "is_live": video.get('is_live', False),
+        "is_ad": video.get('is_ad', False),
+        "is_shareable": is_shareable,
+        "engagement_rate": round(engagement_rate * 100, 2),  # Store as percentage with 2 decimal places
+        "mentioned_users_ids": video.get('mentioned_users_ids', []),
+        "user_id": video.get('author', {}).get('id'),
+        "user_unique_id": video.get('author', {}).get('unique_id'),
+        "user_nickname": video.get('author', {}).get('nickname'),
+        "user_avatar": video.get('author', {}).get('avatar'),
+        "keyword": search_keyword
+    }
+
+# Metrics refreshed on posts that already exist when a scrape is saved with update_existing
+UPDATABLE_COLUMNS = ('play_count', 'comment_count', 'share_count', 'engagement_rate', 'is_shareable')
+
+def _dialect_insert(table):
+    # INSERT construct with ON CONFLICT support, or None on dialects without it
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+def _insert_new_statement():
+    # INSERT ... ON CONFLICT (video_id) DO NOTHING RETURNING video_id, for the dialects
+    # that support it. The returned ids are the rows this statement actually inserted,
+    # even when another writer stores the same video concurrently. Rows are passed at
+    # execution time, so the statement is compiled once; with RETURNING, SQLAlchemy
+    # batches them into multi-row VALUES ("insertmanyvalues") on PostgreSQL and SQLite
+    stmt = _dialect_insert(Post.__table__)
+    if stmt is None:
+        return None
+    return stmt.on_conflict_do_nothing(index_elements=['video_id']).returning(Post.__table__.c.video_id)
+
+def _bump_monthly_stats(posts):
+    # Add newly inserted posts to the monthly_stat rollup, inside the caller's transaction
+    counts = Counter(
+        (post['keyword'] or '', post['create_time'].year, post['create_time'].month)
+        for post in posts if post.get('create_time')
+    )
+    if not counts:
+        return
+
+    rows = [
+        {'keyword': keyword, 'year': year, 'month': month, 'count': count}
+        for (keyword, year, month), count in counts.items()
+    ]
+    stmt = _dialect_insert(MonthlyStat.__table__)
+    if stmt is not None:
+        # Rows go in at execution time like in save_posts: multi-row VALUES on PostgreSQL,
+        # cursor.executemany() on SQLite, which only batches statements with RETURNING
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['keyword', 'year', 'month'],
+            set_={'count': MonthlyStat.__table__.c['count'] + stmt.excluded['count']},
+        ), rows)
+        return
+
+    for row in rows:
+        stat = db.session.get(MonthlyStat, (row['keyword'], row['year'], row['month']))
+        if stat is None:
+            db.session.add(MonthlyStat(**row))
+        else:
+            stat.count += row['count']
+    db.session.flush()
+
+def save_posts(posts, update_existing=False):
+    """Bulk-insert scraped posts, one statement per chunk.
+
+    Returns ``(saved_count, skipped_video_ids)``.  Posts whose video_id is
+    already stored are skipped, or have their metrics refreshed when
+    ``update_existing`` is set.
+    """
+    chunk_size = app.config['INGEST_CHUNK_SIZE']
+    saved_count = 0
+    skipped_videos = []
+    updated_videos = []
+
+    # Keep the first occurrence of a video_id, a statement can't touch the same row twice
+    unique_posts = {}
+    for post in posts:
+        if post['video_id'] in unique_posts:
+            skipped_videos.append(post['video_id'])
+        else:
+            unique_posts[post['video_id']] = post
+    unique_posts = list(unique_posts.values())
+
+    try:
+        for start in range(0, len(unique_posts), chunk_size):
+            chunk = unique_posts[start:start + chunk_size]
+            stmt = _insert_new_statement()
+            if stmt is not None:
+                inserted = set(db.session.scalars(stmt, chunk))
+            else:
+                existing = set(db.session.scalars(
+                    db.select(Post.video_id).where(Post.video_id.in_([post['video_id'] for post in chunk]))
+                ))
+                inserted = {post['video_id'] for post in chunk if post['video_id'] not in existing}
+                if inserted:
+                    db.session.execute(
+                        db.insert(Post.__table__), [post for post in chunk if post['video_id'] in inserted]
+                    )
+
+            new_rows = [post for post in chunk if post['video_id'] in inserted]
+            existing_rows = [post for post in chunk if post['video_id'] not in inserted]
+            if update_existing and existing_rows:
+                table = Post.__table__
+                db.session.execute(
+                    db.update(table).where(table.c.video_id == db.bindparam('b_video_id')),
+                    [
+                        {'b_video_id': post['video_id'], **{column: post[column] for column in UPDATABLE_COLUMNS}}
+                        for post in existing_rows
+                    ],
+                )
+
+            saved_count += len(new_rows)
+            if new_rows:
+                _bump_monthly_stats(new_rows)
+                invalidate_post_count()
+            skipped_videos.extend(post['video_id'] for post in existing_rows)
+            if update_existing:
+                updated_videos.extend(post['video_id'] for post in existing_rows)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error saving posts: {e}")
+        raise
+
+    if saved_count or update_existing:
+        invalidate_cached_responses(post['keyword'] for post in unique_posts)
+    if updated_videos:
+        # New rows reach the analytics snapshot through its id watermark, updated ones need a nudge
+        post_snapshot.mark_updated(updated_videos)
+
+    return saved_count, skipped_videos
+
+class DeltaCrawl:
+    """Delta-crawl bookkeeping for one keyword.
+
+    Drops posts whose video_id is in the keyword's seen filter and in the
+    post table, and flags the crawl to stop at the first page made up only of
+    known posts.  The filter keeps the database check to the few ids it
+    reports as seen.  :meth:`record` adds saved posts to the stored state.
+    """
+
+    def __init__(self, keyword, limit, max_posts):
+        self.state = db.session.get(CrawlState, keyword) or CrawlState(keyword=keyword)
+        if self.state.seen_video_ids:
+            self.seen = BloomFilter.from_bytes(self.state.seen_video_ids)
+        else:
+            self.seen = BloomFilter(app.config['CRAWL_SEEN_CAPACITY'])
+        self.pages_budget = max(1, math.ceil(max_posts / max(limit, 1)))
+        self.pages_fetched = 0
+        self.last_cursor = None
+        self.known_posts = 0
+        self.stopped_early = False
+
+    def filter_page(self, cursor, posts):
+        # Reads the stored state only; crawls that don't save must leave it untouched
+        self.pages_fetched += 1
+        self.last_cursor = cursor
+        # The filter has false positives: confirm its hits against the stored posts, one query per page
+        maybe_known = [post['video_id'] for post in posts if post['video_id'] in self.seen]
+        known = set()
+        if maybe_known:
+            known = set(db.session.scalars(db.select(Post.video_id).where(Post.video_id.in_(maybe_known))))
+        new_posts = [post for post in posts if post['video_id'] not in known]
+        self.known_posts += len(posts) - len(new_posts)
+        if posts and not new_posts:
+            self.stopped_early = True
+        return new_posts
+
+    def record(self, posts):
+        # Only call with posts that are stored in post, or a later delta run would never save them
+        if self.seen.count + len(posts) > self.seen.capacity:
+            # Start a fresh window; older videos are still caught by the ON CONFLICT upsert
+            self.seen = BloomFilter(self.seen.capacity)
+        for post in posts:
+            self.seen.add(post['video_id'])
+            if post['create_time'] and (self.state.newest_create_time is None
+                                        or post['create_time'] > self.state.newest_create_time):
+                self.state.newest_create_time = post['create_time']
+        self.state.last_cursor = self.last_cursor
+        self.state.seen_video_ids = self.seen.to_bytes()
+        self.state.updated_at = datetime.utcnow()
+        db.session.add(self.state)
+        db.session.commit()
+
+    def report(self):
+        return {
+            'pages_fetched': self.pages_fetched,
+            'known_posts_filtered': self.known_posts,
+            'stopped_early': self.stopped_early,
+            'upstream_calls_avoided': max(0, self.pages_budget - self.pages_fetched) if self.stopped_early else 0,
+        }
+
+def iter_scraped_pages(search_keyword, limit, max_posts, publish_time=0, sort=0, delta=None):
+    """Yield the normalized posts of each cursor page, in order, until max_posts are collected.
+
+    Posts already yielded for an earlier page are dropped.  With a
+    :class:`DeltaCrawl`, known posts are dropped too and paging stops at the
+    first fully known page, or after the pages a full crawl of ``max_posts``
+    would have fetched.  Raises ``UpstreamError`` when a page can't be
+    fetched and ``ValueError`` when it can't be parsed.
+    """
+    seen_video_ids = set()
+    collected = 0
+
+    # Don't speculate on more pages than max_posts could ever need; a delta crawl
+    # expects to stop early, so it doesn't speculate at all. It also never fetches
+    # more pages than the full crawl would, however many of their posts are known
+    pages_needed = max(1, math.ceil(max_posts / max(limit, 1)))
+    client = get_tiktok_client()
+    pages = client.iter_pages(
+        search_keyword, limit, publish_time, sort,
+        max_pages=delta.pages_budget if delta is not None else None,
+        prefetch=0 if delta is not None else min(client.max_workers, pages_needed - 1),
+    )
+
+    try:
+        for cursor, post_data in pages:
+            videos = post_data.get('data', {}).get('videos', [])
+            if not videos:
+                print(" No videos found, for pagination")
+                break
+
+            page_posts = []
+            for video in videos:
+                try:
+                    post = build_post(video, search_keyword)
+                except KeyError as e:
+                    print(f"⚠️ Skipping video due to missing key: {e}")
+                    continue
+                # Neighbouring cursor pages can overlap, keep the first occurrence only
+                if post['video_id'] in seen_video_ids:
+                    continue
+                seen_video_ids.add(post['video_id'])
+                page_posts.append(post)
+
+            if delta is not None:
+                page_posts = delta.filter_page(cursor, page_posts)
+                if delta.stopped_early:
+                    print(f"Page {cursor} is already known, stopping delta crawl")
+                    break
+
+            collected += len(page_posts)
+            print(f'Fetched {len(videos)} videos, Total Collected: {collected}')
+            yield page_posts
+            if collected >= max_posts:
+                break
+    finally:
+        pages.close()
+
+def stream_scrape(search_keyword, limit, max_posts, is_save_to_db, update_existing, delta=None):
+    # NDJSON body for stream=1: one line per post as its page arrives, then a summary line
+    saved_count = 0
+    skipped_videos = []
+    try:
+        for page_posts in iter_scraped_pages(search_keyword, limit, max_posts, delta=delta):
+            for post in page_posts:
+                yield app.json.dumps(post) + '\n'
+            if is_save_to_db and page_posts:
+                page_saved, page_skipped = save_posts(page_posts, update_existing=update_existing)
+                saved_count += page_saved
+                skipped_videos.extend(page_skipped)
+                if delta is not None:
+                    delta.record(page_posts)
+    except UpstreamError as e:
+        app.logger.warning(f"Streaming scrape for '{search_keyword}' stopped: {e}")
+        yield app.json.dumps({"error": "Failed to fetch data from the API"}) + '\n'
+    except ValueError as e:
+        print(f"Error in thr parsing API: {e}")
+        yield app.json.dumps({"error": "Failed to parse API response"}) + '\n'
+    except SQLAlchemyError:
+        app.logger.exception(f"Failed to save streamed posts for '{search_keyword}'")
+        yield app.json.dumps({"error": "Failed to save posts"}) + '\n'
+
+    print(f"Total saved to DB: {saved_count}")
+    print(f"Total skipped (already exists): {len(skipped_videos)}")
+    summary = {
+        'saved_posts': saved_count,
+        'skipped_posts': len(skipped_videos),
+        'skipped_video_ids': skipped_videos,
+    }
+    if delta is not None:
+        summary['delta'] = delta.report()
+    yield app.json.dumps({"summary": summary}) + '\n'
+
 # Scrape API to fetch TikTok video posts from TikTok.
 @app.route('/api/scrap-tiktok-data', methods=['GET'])
 def scrap_data():
-    headers = {
-        'x-rapidapi-key': os.getenv('RAPIDAPI_KEY'),
-        'x-rapidapi-host': "tiktok-video-no-watermark2.p.rapidapi.com"
-    }
     search_keyword = request.args.get('keyword', '')
     limit = request.args.get('limit', 30, type=int)
     max_posts = request.args.get('max_posts', 200, type=int)
-    is_save_to_db = request.args.get('is_save_to_db', False, type=bool)
+    is_save_to_db = _as_bool(request.args.get('is_save_to_db', False))
+    update_existing = _as_bool(request.args.get('update_existing', False))
+    stream = _as_bool(request.args.get('stream', False))
+    delta = DeltaCrawl(search_keyword, limit, max_posts) if _as_bool(request.args.get('delta', False)) else None
+
+    if stream:
+        return Response(
+            stream_with_context(stream_scrape(search_keyword, limit, max_posts, is_save_to_db, update_existing, delta)),
+            mimetype='application/x-ndjson'
+        )
 
-    publish_time = 0
-    sort = 0
-    has_more_posts = True
-    cursor = 0
     all_posts = []
     skipped_videos = []
 
-    while has_more_posts and len(all_posts) < max_posts:
-        response = requests.get(
-            f'https://tiktok-video-no-watermark2.p.rapidapi.com/feed/search'
-            f'?keywords={search_keyword}&count={limit}&cursor={cursor}&publish_time={publish_time}&sort_type={sort}',
-            headers=headers
-        )
-
-        try:
-            post_data = response.json()
-        except Exception as e:
-            print(f"Error in thr parsing API: {e}")
-            return jsonify({"error": "Failed to parse API response"}), 500
-
-        videos = post_data.get('data', {}).get('videos', [])
-        if not videos:
-            print(" No videos found, for pagination")
-            break
-
-        for video in videos:
-            try:
-                # Calculate if post is shareable based on engagement metrics
-                play_count = video.get('play_count', 0)
-                comment_count = video.get('comment_count', 0)
-                share_count = video.get('share_count', 0)
-                
-                # Prevent division by zero
-                engagement_rate = 0
-                if play_count > 0:
-                    engagement_rate = (comment_count + share_count) / play_count
-                
-                # A post is considered shareable if:
-                # 1. It has high engagement rate (>0.5%) OR
-                # 2. It has very high view count (>100000)
-                is_shareable = (engagement_rate > 0.005) or (play_count > 100000)
-                
-                all_posts.append({
-                    "video_id": video.get('video_id'),
-                    "region": video.get('region'),
-                    "title": video.get('title'),
-                    "cover_photo": video.get('cover'),
-                    "ai_dynamic_cover_photo": video.get('ai_dynamic_cover'),
-                    "duration": video.get('duration', 0),
-                    "video_link": video.get('video_link'),
-                    "size": video.get('size', 0),
-                    "play_count": play_count,
-                    "comment_count": comment_count,
-                    "share_count": share_count,
-                    "create_time": datetime.utcfromtimestamp(video.get('create_time', 0)) if video.get('create_time') else None,
-                    "download_count": video.get('download_count', 0),
-                    "is_live": video.get('is_live', False),
-                    "is_ad": video.get('is_ad', False),
-                    "is_shareable": is_shareable,
-                    "engagement_rate": round(engagement_rate * 100, 2),  # Store as percentage with 2 decimal places
-                    "mentioned_users_ids": video.get('mentioned_users_ids', []),
-                    "user_id": video.get('author', {}).get('id'),
-                    "user_unique_id": video.get('author', {}).get('unique_id'),
-                    "user_nickname": video.get('author', {}).get('nickname'),
-                    "user_avatar": video.get('author', {}).get('avatar'),
-                    "keyword": search_keyword
-                })
-            except KeyError as e:
-                print(f"⚠️ Skipping video due to missing key: {e}")
-
-        print(f'Fetched {len(videos)} videos, Total Collected: {len(all_posts)}')
-        cursor += 1 
-        has_more_posts = post_data.get('data', {}).get('hasMore', False)
+    try:
+        for page_posts in iter_scraped_pages(search_keyword, limit, max_posts, delta=delta):
+            all_posts.extend(page_posts)
+    except UpstreamError as e:
+        print(f"Error fetching from the API: {e}")
+        return jsonify({"error": "Failed to fetch data from the API"}), 502
+    except ValueError as e:
+        print(f"Error in thr parsing API: {e}")
+        return jsonify({"error": "Failed to parse API response"}), 500
 
     saved_count = 0
     if is_save_to_db:
-        batch_size = 10 
-
-        for i, video in enumerate(all_posts):
-            try:
-                existing_post = Post.query.filter_by(video_id=video['video_id']).first()
-                if not existing_post:
-                    new_post = Post(**video)
-                    db.session.add(new_post)
-                    saved_count += 1
-
-                    if saved_count % batch_size == 0:
-                        db.session.commit()
-                else:
-                    skipped_videos.append(video['video_id']) 
-            except Exception as e:
-                print(f"Error saving video {video['video_id']}: {e}")
-                print(f" Full Data: {video}")
-
-        db.session.commit() 
+        try:
+            saved_count, skipped_videos = save_posts(all_posts, update_existing=update_existing)
+        except Exception:
+            return jsonify({"error": "Failed to save posts"}), 500
+        if delta is not None:
+            delta.record(all_posts)
         print(f"Total saved to DB: {saved_count}")
         print(f"Total skipped (already exists): {len(skipped_videos)}")
         print(f" Skipped Video IDs: {skipped_videos}")
 
-    return jsonify({
+    result = {
         'results': all_posts,
         'saved_posts': saved_count if is_save_to_db else 0,
         'skipped_posts': len(skipped_videos),
         'skipped_video_ids': skipped_videos, 
-    })
+    }
+    if delta is not None:
+        result['delta'] = delta.report()
+    return jsonify(result)
+
+ACTIVE_JOB_STATUSES = ('queued', 'running')
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() not in ('', '0', 'false', 'no', 'off')
+    return bool(value)
+
+def _active_job(keyword):
+    return ScrapeJob.query.filter(
+        ScrapeJob.keyword == keyword, ScrapeJob.status.in_(ACTIVE_JOB_STATUSES)
+    ).order_by(ScrapeJob.id).first()
+
+def enqueue_scrape_job(keyword, limit=30, max_posts=200, save_to_db=False, update_existing=False, delta=False):
+    """Queue a scrape job and return ``(job, created)``.
+
+    A keyword that already has a queued or running job gets that job back
+    instead of a second crawl.  The uq_scrape_job_active_keyword index
+    settles races between processes enqueueing the same keyword.
+    """
+    existing = _active_job(keyword)
+    if existing is not None:
+        return existing, False
+
+    job = ScrapeJob(keyword=keyword, limit=limit, max_posts=max_posts,
+                    save_to_db=save_to_db, update_existing=update_existing, delta=delta, errors=[])
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another process queued the keyword after our check
+        db.session.rollback()
+        existing = _active_job(keyword)
+        if existing is None:
+            raise
+        return existing, False
+    _job_wakeup.set()
+    return job, True
+
+def claim_next_job():
+    """Mark the oldest runnable queued job as running and return its id, or None.
+
+    The claim is a conditional UPDATE, so with several workers (or gunicorn
+    processes) only one of them wins a job, and a keyword that is already
+    being crawled is left in the queue.
+    """
+    table = ScrapeJob.__table__
+    now = datetime.utcnow()
+
+    # Jobs whose worker died (restart, crash) stop sending heartbeats; put them back in the
+    # queue, with a note on how far the interrupted attempt got
+    stale_before = now - timedelta(seconds=app.config['JOB_STALE_AFTER'])
+    is_stale = and_(table.c.status == 'running', table.c.updated_at < stale_before)
+    for job in db.session.execute(db.select(table).where(is_stale)).all():
+        started = job.started_at.isoformat() if job.started_at else 'unknown'
+        note = (f"Attempt started at {started} stopped after {job.pages_fetched} pages "
+                f"({job.posts_saved} posts saved); requeued")
+        db.session.execute(
+            db.update(table).where(table.c.id == job.id, is_stale)
+            .values(status='queued', errors=(job.errors or []) + [note])
+        )
+    db.session.commit()
+
+    candidates = db.session.scalars(
+        db.select(table.c.id).where(table.c.status == 'queued').order_by(table.c.id).limit(10)
+    ).all()
+    running = db.aliased(ScrapeJob)
+    for job_id in candidates:
+        result = db.session.execute(
+            db.update(table)
+            .where(
+                table.c.id == job_id,
+                table.c.status == 'queued',
+                ~db.select(running.id).where(
+                    running.keyword == table.c.keyword, running.status == 'running'
+                ).exists(),
+            )
+            # A requeued job starts over from cursor 0, so its progress does too
+            .values(status='running', started_at=now, updated_at=now,
+                    pages_fetched=0, posts_fetched=0, posts_saved=0, posts_skipped=0)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return job_id
+    return None
+
+def run_scrape_job(job_id):
+    # Crawl page by page, saving and recording progress after every page
+    job = db.session.get(ScrapeJob, job_id)
+    print(f"Running scrape job {job.id} for '{job.keyword}'")
+    try:
+        delta = DeltaCrawl(job.keyword, job.limit, job.max_posts) if job.delta else None
+        for page_posts in iter_scraped_pages(job.keyword, job.limit, job.max_posts, delta=delta):
+            job.pages_fetched += 1
+            job.posts_fetched += len(page_posts)
+            if job.save_to_db and page_posts:
+                saved, skipped = save_posts(page_posts, update_existing=job.update_existing)
+                job.posts_saved += saved
+                job.posts_skipped += len(skipped)
+                if delta is not None:
+                    delta.record(page_posts)
+            job.updated_at = datetime.utcnow()
+            db.session.commit()
+        job.status = 'done'
+    except Exception as e:
+        db.session.rollback()
+        print(f"Scrape job {job.id} failed: {e}")
+        job.errors = (job.errors or []) + [str(e)]
+        job.status = 'failed'
+    job.finished_at = job.updated_at = datetime.utcnow()
+    db.session.commit()
+
+_job_wakeup = threading.Event()
+_job_threads_lock = threading.Lock()
+_job_threads = []
+
+def _job_worker_loop():
+    while True:
+        job_id = None
+        try:
+            with app.app_context():
+                job_id = claim_next_job()
+                if job_id is not None:
+                    run_scrape_job(job_id)
+        except Exception as e:
+            print(f"Job worker error: {e}")
+        if job_id is None:
+            _job_wakeup.wait(app.config['JOB_POLL_INTERVAL'])
+            _job_wakeup.clear()
+
+def _acquire_scheduler_lock():
+    # Non-blocking exclusive lock, held until the process exits; returns the open file or None
+    if fcntl is None:
+        return True
+    lock_file = open(app.config['RECRAWL_LOCK_PATH'], 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def _recrawl_scheduler_loop():
+    # Periodically re-crawl TRACKED_KEYWORDS. Every process runs this loop but only the
+    # one holding the scheduler lock enqueues; the others take over if it exits
+    lock = None
+    while True:
+        try:
+            if lock is None:
+                lock = _acquire_scheduler_lock()
+            if lock is not None:
+                with app.app_context():
+                    for keyword in app.config['TRACKED_KEYWORDS']:
+                        job, created = enqueue_scrape_job(keyword, save_to_db=True, delta=True)
+                        if created:
+                            print(f"Scheduled re-crawl job {job.id} for '{keyword}'")
+        except Exception as e:
+            print(f"Re-crawl scheduler error: {e}")
+        time.sleep(app.config['RECRAWL_INTERVAL'])
+
+def start_job_workers():
+    """Start this process's job workers and re-crawl scheduler, once."""
+    with _job_threads_lock:
+        if _job_threads or app.config['JOB_WORKERS'] <= 0:
+            return
+        for i in range(app.config['JOB_WORKERS']):
+            _job_threads.append(threading.Thread(target=_job_worker_loop, name=f'scrape-job-{i}', daemon=True))
+        if app.config['TRACKED_KEYWORDS']:
+            _job_threads.append(threading.Thread(target=_recrawl_scheduler_loop, name='recrawl-scheduler', daemon=True))
+        for thread in _job_threads:
+            thread.start()
+
+@app.before_request
+def ensure_job_workers():
+    # Workers start with the first request so CLI commands and imports don't spawn threads
+    if not _job_threads:
+        start_job_workers()
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    payload = request.get_json(silent=True) or request.values
+    keyword = (payload.get('keyword') or '').strip()
+    if not keyword:
+        return jsonify({"error": "keyword is required"}), 400
+
+    try:
+        limit = int(payload.get('limit', 30))
+        max_posts = int(payload.get('max_posts', 200))
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit and max_posts must be integers"}), 400
+
+    job, created = enqueue_scrape_job(
+        keyword,
+        limit=limit,
+        max_posts=max_posts,
+        save_to_db=_as_bool(payload.get('is_save_to_db', False)),
+        update_existing=_as_bool(payload.get('update_existing', False)),
+        delta=_as_bool(payload.get('delta', False)),
+    )
+    return jsonify({"job": job.to_dict(), "deduplicated": not created}), 202 if created else 200
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    query = ScrapeJob.query
+    status = request.args.get('status')
+    if status:
+        query = query.filter(ScrapeJob.status == status)
+    jobs = query.order_by(ScrapeJob.id.desc()).limit(request.args.get('limit', 50, type=int)).all()
+    return jsonify([job.to_dict() for job in jobs])
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    job = db.session.get(ScrapeJob, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+def serialize_post(post):
+    return {
+        "video_id": post.video_id,
+        "title": post.title,
+        "user_nickname": post.user_nickname,
+        "play_count": post.play_count,
+        "comment_count": post.comment_count,
+        "share_count": post.share_count,
+        "create_time": post.create_time.strftime('%Y-%m-%d') if post.create_time else None,
+        "keyword": post.keyword,
+        "is_shareable": post.is_shareable,
+        "engagement_rate": post.engagement_rate,
+    }
+
+# Process-local cache of the post total, refreshed after POST_COUNT_TTL seconds or on ingest
+_post_count_cache = {'value': None, 'expires': 0.0}
+
+def invalidate_post_count():
+    _post_count_cache['expires'] = 0.0
+
+def get_post_count():
+    if _post_count_cache['value'] is not None and time.monotonic() < _post_count_cache['expires']:
+        return _post_count_cache['value']
+
+    total = None
+    if db.engine.dialect.name == 'postgresql':
+        # The planner estimate is free; only trust it once the table is big enough that exact counts hurt
+        estimate = db.session.execute(
+            db.text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'post'::regclass")
+        ).scalar()
+        if estimate is not None and estimate >= app.config['POST_COUNT_ESTIMATE_THRESHOLD']:
+            total = int(estimate)
+    if total is None:
+        total = db.session.scalar(db.select(func.count(Post.id)))
+
+    _post_count_cache['value'] = total
+    _post_count_cache['expires'] = time.monotonic() + app.config['POST_COUNT_TTL']
+    return total
+
+def encode_cursor(post):
+    payload = [post.create_time.isoformat() if post.create_time else None, post.id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    # Returns (create_time, id); raises ValueError for anything that isn't a token we issued
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        create_time, post_id = json.loads(base64.urlsafe_b64decode(padded))
+        create_time = datetime.fromisoformat(create_time) if create_time is not None else None
+        return create_time, int(post_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+def keyset_page(query, after, per_page):
+    """Return ``(posts, has_next)`` for the page following the ``after`` cursor.
+
+    Posts are ordered by ``(create_time, id)`` descending, which the
+    ix_post_create_time_id index serves directly.  Posts without a
+    create_time come last, ordered by id.
+    """
+    items = []
+    if after is None or after[0] is not None:
+        dated = query.filter(Post.create_time.isnot(None))
+        if after is not None:
+            create_time, post_id = after
+            # The redundant <= bound lets the index scan start at the cursor;
+            # with the OR alone SQLite walks every newer post first
+            dated = dated.filter(Post.create_time <= create_time, or_(
+                Post.create_time < create_time,
+                and_(Post.create_time == create_time, Post.id < post_id),
+            ))
+        items = dated.order_by(Post.create_time.desc(), Post.id.desc()).limit(per_page + 1).all()
+
+    if len(items) <= per_page:
+        undated = query.filter(Post.create_time.is_(None))
+        if after is not None and after[0] is None:
+            undated = undated.filter(Post.id < after[1])
+        items += undated.order_by(Post.id.desc()).limit(per_page + 1 - len(items)).all()
+
+    return items[:per_page], len(items) > per_page
+
+def offset_page(query, offset, per_page):
+    """Return ``(posts, has_next)`` for OFFSET paging, in the same order as :func:`keyset_page`.
+
+    Dated and undated posts are read separately rather than with NULLS LAST,
+    which PostgreSQL can't serve from the ascending create_time indexes.
+    """
+    dated = query.filter(Post.create_time.isnot(None))
+    items = dated.order_by(Post.create_time.desc(), Post.id.desc()).offset(offset).limit(per_page + 1).all()
+
+    if len(items) <= per_page:
+        # Pages past the last dated post need to know how many came before
+        undated_offset = max(0, offset - dated.count()) if not items else 0
+        undated = query.filter(Post.create_time.is_(None)).order_by(Post.id.desc())
+        items += undated.offset(undated_offset).limit(per_page + 1 - len(items)).all()
+
+    return items[:per_page], len(items) > per_page
 
 @app.route('/api/posts', methods=['GET'])
+@cached_response
 def get_posts():
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-    
-    # Get total count for pagination
-    total_posts = Post.query.count()
-    
-    # Get paginated posts
-    posts = Post.query.order_by(Post.create_time.desc()).paginate(page=page, per_page=per_page, error_out=False)
-    
-    results = []
-    for post in posts.items:
-        results.append({
-            "video_id": post.video_id,
-            "title": post.title,
-            "user_nickname": post.user_nickname,
-            "play_count": post.play_count,
-            "comment_count": post.comment_count,
-            "share_count": post.share_count,
-            "create_time": post.create_time.strftime('%Y-%m-%d') if post.create_time else None,
-            "keyword": post.keyword,
-            "is_shareable": post.is_shareable,
-            "engagement_rate": post.engagement_rate,
-            "is_shareable": post.is_shareable
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = max(request.args.get('per_page', 10, type=int), 1)
+    after = request.args.get('after')
+    try:
+        conditions = post_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = Post.query.filter(*conditions)
+
+    # Get total count for pagination, filtered counts go through the filter indexes
+    if conditions:
+        total_posts = db.session.scalar(db.select(func.count(Post.id)).where(*conditions))
+    else:
+        total_posts = get_post_count()
+    total_pages = math.ceil(total_posts / per_page)
+
+    # Cursor mode: pass after= (empty for the first page) and follow next_cursor
+    if after is not None:
+        try:
+            cursor = decode_cursor(after) if after else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        posts, has_next = keyset_page(query, cursor, per_page)
+        return jsonify({
+            'results': [serialize_post(post) for post in posts],
+            'pagination': {
+                'total': total_posts,
+                'pages': total_pages,
+                'per_page': per_page,
+                'has_next': has_next,
+                'has_prev': cursor is not None,
+                'next_cursor': encode_cursor(posts[-1]) if has_next else None
+            }
         })
-    
+
+    # Get paginated posts, one extra row tells us whether there is a next page
+    posts, has_next = offset_page(query, (page - 1) * per_page, per_page)
+
     # Return pagination metadata along with results
     return jsonify({
-        'results': results,
+        'results': [serialize_post(post) for post in posts],
         'pagination': {
             'total': total_posts,
-            'pages': posts.pages,
+            'pages': total_pages,
             'page': page,
             'per_page': per_page,
-            'has_next': posts.has_next,
-            'has_prev': posts.has_prev
+            'has_next': has_next,
+            'has_prev': page > 1
         }
     })
 
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"{name} must be a date like 2025-01-31")
+
+def post_filters():
+    """SQL conditions for the keyword, start/end date and shareable query args.
+
+    Raises ``ValueError`` with a message for the client on malformed args.
+    """
+    conditions = []
+    keyword = request.args.get('keyword')
+    if keyword and keyword != 'all':
+        conditions.append(Post.keyword == keyword)
+
+    start = parse_date_arg('start')
+    end = parse_date_arg('end')
+    if start:
+        conditions.append(Post.create_time >= start)
+    if end:
+        # end is inclusive, so compare against the start of the following day
+        conditions.append(Post.create_time < end + timedelta(days=1))
+
+    shareable = request.args.get('shareable')
+    if shareable:
+        conditions.append(Post.is_shareable.is_(_as_bool(shareable)))
+
+    creator = request.args.get('creator')
+    if creator:
+        conditions.append(or_(Post.user_unique_id == creator, Post.user_nickname == creator))
+
+    region = request.args.get('region')
+    if region:
+        conditions.append(Post.region == region)
+
+    q = request.args.get('q', '').strip()
+    if q:
+        conditions.append(title_search(q))
+    return conditions
+
+def _has_post_fts():
+    # post_fts only exists once `flask db upgrade` ran; create_all() doesn't make it
+    return db.session.execute(
+        db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post_fts'")
+    ).first() is not None
+
+def title_search(q):
+    """Full-text condition on the title, through the index the migrations create per dialect.
+
+    Falls back to ILIKE on SQLite databases that haven't been migrated yet.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        # Same expression as the ix_post_title_fts GIN index
+        document = func.to_tsvector('simple', func.coalesce(Post.title, ''))
+        return document.op('@@')(func.plainto_tsquery('simple', q))
+
+    words = re.findall(r'\w+', q)
+    if dialect == 'sqlite' and words and _has_post_fts():
+        # Quote every word so user input can't break FTS5 query syntax; words are ANDed
+        match = ' '.join(f'"{word}"' for word in words)
+        return Post.id.in_(db.text('SELECT rowid FROM post_fts WHERE post_fts MATCH :match').bindparams(match=match))
+
+    return and_(*(Post.title.ilike(f'%{word}%') for word in words or [q]))
+
+EXPORT_COLUMNS = [column.name for column in Post.__table__.columns]
+
+def _export_row(row):
+    row = dict(row._mapping)
+    if row['create_time'] is not None:
+        row['create_time'] = row['create_time'].isoformat()
+    return row
+
+def iter_export(engine, stmt, export_format):
+    # Rows come from a server-side cursor in EXPORT_BATCH_SIZE partitions, so memory stays flat
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=app.config['EXPORT_BATCH_SIZE']).execute(stmt)
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+            writer.writeheader()
+            for partition in result.partitions():
+                for row in partition:
+                    row = _export_row(row)
+                    row['mentioned_users_ids'] = json.dumps(row['mentioned_users_ids'] or [])
+                    writer.writerow(row)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for partition in result.partitions():
+                yield ''.join(json.dumps(_export_row(row)) + '\n' for row in partition)
+
+@app.route('/api/posts/export', methods=['GET'])
+def export_posts():
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    try:
+        conditions = post_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stmt = db.select(Post.__table__).where(*conditions).order_by(Post.id)
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(
+        iter_export(db.engine, stmt, export_format),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=posts.{export_format}'}
+    )
+
 @app.route('/api/keywords', methods=['GET'])
+@cached_response
 def get_keywords():
     # Get distinct keywords from the database
     keywords = db.session.query(Post.keyword).distinct().filter(Post.keyword.isnot(None)).all()
@@ -236,31 +1207,115 @@ def get_keywords():
     return jsonify(keyword_list)
 
 @app.route('/api/monthly-stats', methods=['GET'])
+@cached_response
 def get_monthly_stats():
     keyword = request.args.get('keyword', None)
-    
-    # Base query
+
+    # Base query, served from the rollup instead of scanning post
     query = db.session.query(
-        extract('year', Post.create_time).label('year'),
-        extract('month', Post.create_time).label('month'),
-        func.count(Post.id).label('count')
-    ).filter(Post.create_time.isnot(None))
-    
+        MonthlyStat.year,
+        MonthlyStat.month,
+        func.sum(MonthlyStat.count).label('count')
+    )
+
     # keyword filter if provided
     if keyword and keyword != 'all':
-        query = query.filter(Post.keyword == keyword)
-    
-    monthly_counts = query.group_by('year', 'month').order_by('year', 'month').all()
-    
+        query = query.filter(MonthlyStat.keyword == keyword)
+
+    monthly_counts = query.group_by(MonthlyStat.year, MonthlyStat.month).order_by(MonthlyStat.year, MonthlyStat.month).all()
+
     result = []
     for year, month, count in monthly_counts:
+        if not count:
+            continue
         result.append({
             "date": f"{int(year)}-{int(month):02d}",
-            "count": count
+            "count": int(count)
         })
-    
-    print('result==>', result)
+
+    app.logger.debug('Monthly stats for %s: %d months', keyword or 'all', len(result))
     return jsonify(result)
 
+ANALYTICS_GROUPS = {'keyword': 'keyword', 'creator': 'user_unique_id'}
+TREND_FREQUENCIES = {'day': 'D', 'week': 'W', 'month': 'M'}
+
+@app.route('/api/analytics/engagement', methods=['GET'])
+@cached_response
+def get_engagement_analytics():
+    by = request.args.get('by', 'keyword')
+    if by not in ANALYTICS_GROUPS:
+        return jsonify({"error": f"by must be one of: {', '.join(ANALYTICS_GROUPS)}"}), 400
+    min_posts = request.args.get('min_posts', 1, type=int)
+
+    frame = analytics.filter_keyword(post_snapshot.refresh(db.engine), request.args.get('keyword'))
+    stats = analytics.engagement_percentiles(frame, ANALYTICS_GROUPS[by], min_posts=min_posts)
+    if by == 'creator':
+        # Attach a display name for each creator
+        nicknames = frame.drop_duplicates('user_unique_id', keep='last').set_index('user_unique_id')['user_nickname']
+        stats.insert(1, 'user_nickname', stats['user_unique_id'].map(nicknames).astype(object))
+    return jsonify(analytics.to_records(stats.head(request.args.get('limit', 100, type=int))))
+
+@app.route('/api/analytics/top-shareable', methods=['GET'])
+@cached_response
+def get_top_shareable():
+    n = min(max(request.args.get('n', 10, type=int), 1), 100)
+    frame = analytics.filter_keyword(post_snapshot.refresh(db.engine), request.args.get('keyword'))
+    top_ids = [int(post_id) for post_id in analytics.top_shareable(frame, n)['id']]
+
+    # Only the winners are read back from the database, in ranking order
+    posts = {post.id: post for post in Post.query.filter(Post.id.in_(top_ids))}
+    return jsonify([serialize_post(posts[post_id]) for post_id in top_ids if post_id in posts])
+
+@app.route('/api/analytics/trends', methods=['GET'])
+@cached_response
+def get_trends():
+    freq = request.args.get('freq', 'month')
+    if freq not in TREND_FREQUENCIES:
+        return jsonify({"error": f"freq must be one of: {', '.join(TREND_FREQUENCIES)}"}), 400
+
+    frame = analytics.filter_keyword(post_snapshot.refresh(db.engine), request.args.get('keyword'))
+    return jsonify(analytics.to_records(analytics.growth_trends(frame, TREND_FREQUENCIES[freq])))
+
+def compute_monthly_stats():
+    # Full scan of post, only used to backfill or verify the rollup
+    rows = db.session.query(
+        func.coalesce(Post.keyword, ''),
+        extract('year', Post.create_time),
+        extract('month', Post.create_time),
+        func.count(Post.id)
+    ).filter(Post.create_time.isnot(None)).group_by(
+        func.coalesce(Post.keyword, ''),
+        extract('year', Post.create_time),
+        extract('month', Post.create_time)
+    ).all()
+    return {(keyword, int(year), int(month)): count for keyword, year, month, count in rows}
+
+@app.cli.command('rebuild-monthly-stats')
+@click.option('--check', is_flag=True, help='Only compare the rollup with the post table, change nothing.')
+def rebuild_monthly_stats(check):
+    """Rebuild the monthly_stat rollup from the post table."""
+    expected = compute_monthly_stats()
+
+    if check:
+        stored = {(stat.keyword, stat.year, stat.month): stat.count for stat in MonthlyStat.query if stat.count}
+        mismatches = sorted(key for key in expected.keys() | stored.keys() if expected.get(key) != stored.get(key))
+        for keyword, year, month in mismatches:
+            click.echo(f"{keyword or '<none>'} {year}-{month:02d}: "
+                       f"rollup={stored.get((keyword, year, month), 0)} "
+                       f"actual={expected.get((keyword, year, month), 0)}")
+        click.echo(f"{len(mismatches)} mismatched month(s)")
+        if mismatches:
+            raise SystemExit(1)
+        return
+
+    db.session.execute(db.delete(MonthlyStat))
+    db.session.add_all(
+        MonthlyStat(keyword=keyword, year=year, month=month, count=count)
+        for (keyword, year, month), count in expected.items()
+    )
+    db.session.commit()
+    response_cache.clear()
+    click.echo(f"Rebuilt monthly_stat with {len(expected)} row(s)")
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0')
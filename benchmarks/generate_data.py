@@ -0,0 +1,75 @@
+"""Fill the post table with synthetic rows spread over many keywords and months.
+
+    DB_URL=sqlite:///bench.db python -m benchmarks.generate_data --rows 100000
+
+Rows go through save_posts(), so the monthly rollup stays consistent with them.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+WORDS = ('cat', 'dog', 'dance', 'recipe', 'travel', 'prank', 'fitness', 'music', 'diy', 'gaming',
+         'makeup', 'football', 'comedy', 'tutorial', 'asmr', 'vlog', 'fashion', 'science', 'art', 'news')
+
+
+def generate_posts(rows, keywords=50, months=24, creators=5000, seed=42, start=0):
+    """Yield ``rows`` normalized post dicts (the shape scrap_data saves), reproducible for a seed."""
+    from app import build_post
+
+    rng = random.Random(seed + start)
+    newest = datetime(2025, 1, 1)
+    span = timedelta(days=30 * months).total_seconds()
+    for i in range(start, start + rows):
+        creator = rng.randrange(creators)
+        plays = int(rng.paretovariate(1.2) * 500)
+        video = {
+            "video_id": f"synthetic-{i}",
+            "region": rng.choice(('US', 'GB', 'DE', 'BR', 'IN', 'ID', 'PK')),
+            "title": ' '.join(rng.sample(WORDS, 4)),
+            "duration": rng.randint(5, 180),
+            "size": rng.randint(100000, 50000000),
+            "play_count": plays,
+            "comment_count": int(plays * rng.uniform(0, 0.01)),
+            "share_count": int(plays * rng.uniform(0, 0.005)),
+            "download_count": int(plays * rng.uniform(0, 0.002)),
+            "create_time": int(newest.timestamp() - rng.uniform(0, span)),
+            "author": {
+                "id": str(creator),
+                "unique_id": f"creator{creator}",
+                "nickname": f"Creator {creator}",
+            },
+        }
+        yield build_post(video, f"keyword{rng.randrange(keywords)}")
+
+
+def populate(rows, keywords=50, months=24, seed=42, chunk_size=10000):
+    """Insert ``rows`` synthetic posts in chunks; returns the number of rows saved."""
+    from app import save_posts
+
+    saved = 0
+    for start in range(0, rows, chunk_size):
+        count = min(chunk_size, rows - start)
+        posts = list(generate_posts(count, keywords=keywords, months=months, seed=seed, start=start))
+        saved += save_posts(posts)[0]
+    return saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--keywords', type=int, default=50)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app import app
+
+    started = time.perf_counter()
+    with app.app_context():
+        saved = populate(args.rows, keywords=args.keywords, months=args.months, seed=args.seed)
+    print(f"Saved {saved} synthetic posts in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
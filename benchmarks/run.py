@@ -0,0 +1,218 @@
+"""Benchmark scrape+ingest throughput and read endpoint latency, and compare runs.
+
+    python -m benchmarks.run --rows 100000 --output results.json
+    python -m benchmarks.run --rows 100000 --baseline benchmarks/baseline.json
+    python -m benchmarks.run --rows 100000 --baseline benchmarks/baseline.json --save-baseline
+
+Runs against a fresh SQLite file unless --db-url is given, and never against
+the DB_URL from .env.  The scrape benchmark uses the local RapidAPI stub.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Where a higher number is the better one; every other metric is a latency
+THROUGHPUT_METRICS = ('posts_per_second', 'rows_per_second')
+COMPARED_METRICS = ('p50_ms', 'p99_ms') + THROUGHPUT_METRICS
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db-url', help='database to benchmark (default: a new temporary SQLite file)')
+    parser.add_argument('--rows', type=int, default=10000, help='synthetic posts to generate')
+    parser.add_argument('--keywords', type=int, default=50)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--runs', type=int, default=50, help='timed requests per endpoint')
+    parser.add_argument('--scrape-pages', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help='stub delay per upstream page, seconds')
+    parser.add_argument('--cache', action='store_true', help='keep the response cache on (off by default)')
+    parser.add_argument('--output', default='benchmarks/results.json')
+    parser.add_argument('--baseline', help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='write these results to --baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown before a metric counts as a regression')
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    # Must run before app is imported: its configuration is read at import time
+    if args.db_url:
+        os.environ['DB_URL'] = args.db_url
+    else:
+        os.environ['DB_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')
+    os.environ['JOB_WORKERS'] = '0'
+    os.environ['RAPIDAPI_RATE_LIMIT'] = '0'
+    os.environ['SLOW_REQUEST_MS'] = '0'
+    if not args.cache:
+        os.environ['RESPONSE_CACHE_TTL'] = '0'
+
+
+def summarize(samples):
+    samples_ms = np.array(samples) * 1000
+    return {
+        'runs': len(samples),
+        'p50_ms': round(float(np.percentile(samples_ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(samples_ms, 99)), 3),
+        'mean_ms': round(float(samples_ms.mean()), 3),
+    }
+
+
+def time_endpoint(client, url, runs, warmup=3):
+    for _ in range(warmup):
+        client.get(url)
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+    return summarize(samples)
+
+
+def bench_scrape(app, client, args):
+    from benchmarks.stub_server import start_stub_server
+
+    per_page = 30
+    server, base_url = start_stub_server(pages=args.scrape_pages, per_page=per_page, latency=args.latency)
+    app.config['RAPIDAPI_BASE_URL'] = base_url
+    app.extensions.pop('tiktok_client', None)
+    try:
+        started = time.perf_counter()
+        response = client.get(
+            f'/api/scrap-tiktok-data?keyword=scrape-bench&limit={per_page}'
+            f'&max_posts={args.scrape_pages * per_page}&is_save_to_db=1'
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    data = response.get_json()
+    posts = len(data['results'])
+    return {
+        'pages': args.scrape_pages,
+        'upstream_latency_ms': args.latency * 1000,
+        'posts': posts,
+        'saved': data['saved_posts'],
+        'seconds': round(elapsed, 3),
+        'posts_per_second': round(posts / elapsed, 1),
+    }
+
+
+def bench_ingest(args):
+    from benchmarks.generate_data import populate
+
+    started = time.perf_counter()
+    saved = populate(args.rows, keywords=args.keywords, months=args.months)
+    elapsed = time.perf_counter() - started
+    return {'rows': saved, 'seconds': round(elapsed, 3), 'rows_per_second': round(saved / elapsed, 1)}
+
+
+def bench_endpoints(client, args):
+    from app import db, Post, encode_cursor
+
+    per_page = 10
+    deep_page = max(1, args.rows // per_page - 1)
+    # Cursor for the same position as deep_page, to compare keyset with OFFSET paging
+    deep_post = (Post.query.filter(Post.create_time.isnot(None))
+                 .order_by(Post.create_time.desc(), Post.id.desc())
+                 .offset((deep_page - 1) * per_page - 1).first())
+
+    endpoints = {
+        'posts_first_page': f'/api/posts?page=1&per_page={per_page}',
+        'posts_deep_page': f'/api/posts?page={deep_page}&per_page={per_page}',
+        'keywords': '/api/keywords',
+        'monthly_stats': '/api/monthly-stats',
+        'monthly_stats_keyword': '/api/monthly-stats?keyword=keyword1',
+    }
+    if deep_post is not None:
+        endpoints['posts_deep_cursor'] = f'/api/posts?per_page={per_page}&after={encode_cursor(deep_post)}'
+    db.session.remove()
+
+    return {name: {'url': url, **time_endpoint(client, url, args.runs)} for name, url in endpoints.items()}
+
+
+def compare(results, baseline, tolerance):
+    """Print each metric against the baseline and return the ones that regressed.
+
+    The printed change is positive when the metric got worse, for latencies
+    and throughputs alike.
+    """
+    regressions = []
+    for name, metrics in results['results'].items():
+        base = baseline.get('results', {}).get(name, {})
+        for metric in COMPARED_METRICS:
+            if metric not in metrics or not base.get(metric):
+                continue
+            change = (metrics[metric] - base[metric]) / base[metric]
+            if metric in THROUGHPUT_METRICS:
+                change = -change
+            status = 'REGRESSION' if change > tolerance else 'ok'
+            print(f"  {name:24} {metric:18} {base[metric]:>12} -> {metrics[metric]:>12}  {change:+7.0%}  {status}")
+            if change > tolerance:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+
+    from app import app, db
+
+    results = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rows': args.rows,
+            'runs': args.runs,
+            'response_cache': args.cache,
+        },
+        'results': {},
+    }
+
+    client = app.test_client()
+    with app.app_context():
+        results['meta']['database'] = db.engine.dialect.name
+        print("Benchmarking scrape + ingest against the stub server...")
+        results['results']['scrape_ingest'] = bench_scrape(app, client, args)
+        print(f"Generating {args.rows} synthetic posts...")
+        results['results']['bulk_ingest'] = bench_ingest(args)
+        print(f"Timing read endpoints ({args.runs} runs each)...")
+        results['results'].update(bench_endpoints(client, args))
+
+    for name, metrics in results['results'].items():
+        print(f"  {name:24} " + ', '.join(f"{key}={value}" for key, value in metrics.items() if key != 'url'))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Comparing with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
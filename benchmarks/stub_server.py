@@ -0,0 +1,118 @@
+"""Local stand-in for the RapidAPI /feed/search endpoint.
+
+Replays deterministic cursor pages with a configurable delay and ``hasMore``
+behaviour, so scrape benchmarks and tests never touch the real API.
+
+    python -m benchmarks.stub_server --port 8099 --pages 20 --latency 0.2
+
+then point the app at it with ``RAPIDAPI_BASE_URL=http://127.0.0.1:8099``.
+"""
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Fixed reference point so generated create_times don't depend on when the stub runs
+EPOCH = 1735689600  # 2025-01-01 UTC
+
+
+def make_video(cursor, index):
+    # Deterministic pseudo-random metrics derived from the video's position
+    seed = zlib.crc32(f"{cursor}-{index}".encode())
+    return {
+        "video_id": f"{cursor}-{index}",
+        "region": ("US", "GB", "DE", "BR", "IN")[seed % 5],
+        "title": f"Stub video {index} on page {cursor}",
+        "cover": f"https://example.com/{cursor}-{index}.jpg",
+        "duration": 5 + seed % 55,
+        "video_link": f"https://example.com/{cursor}-{index}.mp4",
+        "size": 100000 + seed % 900000,
+        "play_count": 100 + seed % 500000,
+        "comment_count": seed % 900,
+        "share_count": (seed >> 8) % 400,
+        "download_count": (seed >> 4) % 100,
+        "create_time": EPOCH - (cursor * 86400) - index * 600,
+        "mentioned_users_ids": [],
+        "author": {
+            "id": str(seed % 97),
+            "unique_id": f"creator{seed % 97}",
+            "nickname": f"Creator {seed % 97}",
+            "avatar": "https://example.com/avatar.jpg",
+        },
+    }
+
+
+class StubFeedHandler(BaseHTTPRequestHandler):
+    """Serves ``pages`` cursor pages of ``per_page`` videos, each after ``latency`` seconds.
+
+    ``has_more`` is ``'auto'`` (true until the last page), ``'always'`` or
+    ``'never'``.  Configure by subclassing or through :func:`start_stub_server`.
+    """
+    pages = 6
+    per_page = 5
+    latency = 0.1
+    has_more = 'auto'
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        cursor = int(query.get('cursor', ['0'])[0])
+        time.sleep(self.latency)
+
+        videos = [make_video(cursor, i) for i in range(self.per_page)] if cursor < self.pages else []
+        if self.has_more == 'auto':
+            has_more = cursor + 1 < self.pages
+        else:
+            has_more = self.has_more == 'always'
+
+        body = json.dumps({"data": {"videos": videos, "hasMore": has_more}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host='127.0.0.1', port=0, handler=StubFeedHandler, **settings):
+    """Start a stub server on a background thread; returns ``(server, base_url)``.
+
+    ``settings`` override the handler's class attributes (pages, per_page,
+    latency, has_more).  Call ``server.shutdown()`` and ``server.server_close()``
+    when done.
+    """
+    if settings:
+        handler = type('ConfiguredStubFeedHandler', (handler,), settings)
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--per-page', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds before each page is answered')
+    parser.add_argument('--has-more', choices=('auto', 'always', 'never'), default='auto')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        args.host, args.port, pages=args.pages, per_page=args.per_page,
+        latency=args.latency, has_more=args.has_more,
+    )
+    print(f"Stub /feed/search listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import hashlib
+import math
+import struct
+
+_HEADER = struct.Struct('>IIII')  # num_bits, num_hashes, count, capacity
+
+
+class BloomFilter:
+    """Compact set of strings with no false negatives and a tunable false positive rate.
+
+    Sized for ``capacity`` items at ``error_rate``; serializes to bytes so it
+    can be stored in a database column.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.01):
+        self.capacity = capacity
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing: k positions from two independent 64-bit hashes
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack('>QQ', digest)
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def to_bytes(self):
+        return _HEADER.pack(self.num_bits, self.num_hashes, self.count, self.capacity) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        bloom = cls.__new__(cls)
+        bloom.num_bits, bloom.num_hashes, bloom.count, bloom.capacity = _HEADER.unpack_from(data)
+        bloom.bits = bytearray(data[_HEADER.size:])
+        return bloom
@@ -0,0 +1,34 @@
+"""add unique index on active scrape job keyword
+
+Revision ID: 1a548a1d0186
+Revises: 515edacd64e7
+Create Date: 2026-10-18 18:50:20.710119
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1a548a1d0186'
+down_revision = '515edacd64e7'
+branch_labels = None
+depends_on = None
+
+# Must match ScrapeJob.__table_args__ and app.ACTIVE_JOB_STATUSES
+ACTIVE = sa.text("status IN ('queued', 'running')")
+
+
+def upgrade():
+    # Keep the oldest active job per keyword; duplicates queued before this index can't coexist with it
+    op.execute(
+        "UPDATE scrape_job SET status = 'failed', finished_at = CURRENT_TIMESTAMP "
+        "WHERE status IN ('queued', 'running') AND id NOT IN ("
+        "SELECT MIN(id) FROM scrape_job WHERE status IN ('queued', 'running') GROUP BY keyword)"
+    )
+    op.create_index('uq_scrape_job_active_keyword', 'scrape_job', ['keyword'], unique=True,
+                    postgresql_where=ACTIVE, sqlite_where=ACTIVE, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('uq_scrape_job_active_keyword', table_name='scrape_job', if_exists=True)
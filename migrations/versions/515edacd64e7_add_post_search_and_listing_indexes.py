@@ -0,0 +1,70 @@
+"""add post search and listing indexes
+
+Revision ID: 515edacd64e7
+Revises: 
+Create Date: 2026-10-18 18:34:37.989572
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '515edacd64e7'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Tables are created by db.create_all() at startup, so this revision only adds
+# what create_all() can't: indexes on an existing post table and full-text search.
+POST_INDEXES = {
+    'ix_post_create_time_id': ['create_time', 'id'],
+    'ix_post_keyword_create_time': ['keyword', 'create_time', 'id'],
+    'ix_post_is_shareable_create_time': ['is_shareable', 'create_time', 'id'],
+    'ix_post_user_unique_id': ['user_unique_id'],
+    'ix_post_user_nickname': ['user_nickname'],
+    'ix_post_region': ['region'],
+}
+
+
+def upgrade():
+    for name, columns in POST_INDEXES.items():
+        op.create_index(name, 'post', columns, if_not_exists=True)
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Must match the expression app.title_search() queries with
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_post_title_fts ON post "
+            "USING gin (to_tsvector('simple', coalesce(title, '')))"
+        )
+    elif dialect == 'sqlite':
+        # External-content FTS5 table over post.title, kept in sync by triggers
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(title, content='post', content_rowid='id')")
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS post_fts_ai AFTER INSERT ON post BEGIN "
+            "INSERT INTO post_fts(rowid, title) VALUES (new.id, new.title); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS post_fts_ad AFTER DELETE ON post BEGIN "
+            "INSERT INTO post_fts(post_fts, rowid, title) VALUES ('delete', old.id, old.title); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS post_fts_au AFTER UPDATE OF title ON post BEGIN "
+            "INSERT INTO post_fts(post_fts, rowid, title) VALUES ('delete', old.id, old.title); "
+            "INSERT INTO post_fts(rowid, title) VALUES (new.id, new.title); END"
+        )
+        op.execute("INSERT INTO post_fts(post_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_post_title_fts")
+    elif dialect == 'sqlite':
+        for trigger in ('post_fts_ai', 'post_fts_ad', 'post_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS post_fts")
+
+    for name in POST_INDEXES:
+        op.drop_index(name, table_name='post', if_exists=True)
@@ -0,0 +1,140 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class MemoryCache:
+    """Per-process LRU cache whose entries expire after ``ttl`` seconds.
+
+    Every entry carries a tag (a keyword, or ``'*'`` for unfiltered data) so
+    an ingest can drop just the entries it made stale.
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        # Returns (etag, body) or None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            tag, etag, body, expires = entry
+            if expires < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return etag, body
+
+    def set(self, key, tag, etag, body):
+        with self.lock:
+            self.entries[key] = (tag, etag, body, time.time() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, tags):
+        tags = set(tags)
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry[0] in tags]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SQLiteCache:
+    """Cache kept in a SQLite file, shared by every gunicorn worker on the host.
+
+    Same interface as :class:`MemoryCache`; invalidation from any worker is
+    seen by all of them.
+    """
+
+    def __init__(self, path, maxsize=256, ttl=300):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache ('
+                ' key TEXT PRIMARY KEY, tag TEXT, etag TEXT, body BLOB, expires REAL, used REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_tag ON response_cache (tag)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT etag, body FROM response_cache WHERE key = ? AND expires >= ?', (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE response_cache SET used = ? WHERE key = ?', (now, key))
+            return row[0], bytes(row[1])
+
+    def set(self, key, tag, etag, body):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, tag, etag, body, expires, used) VALUES (?, ?, ?, ?, ?, ?)',
+                (key, tag, etag, body, now + self.ttl, now),
+            )
+            # Drop expired entries, then the least recently used ones above maxsize
+            conn.execute('DELETE FROM response_cache WHERE expires < ?', (now,))
+            conn.execute(
+                'DELETE FROM response_cache WHERE key IN ('
+                ' SELECT key FROM response_cache ORDER BY used DESC LIMIT -1 OFFSET ?)',
+                (self.maxsize,),
+            )
+
+    def invalidate(self, tags):
+        tags = list(set(tags))
+        if not tags:
+            return
+        placeholders = ', '.join('?' for _ in tags)
+        with self._connect() as conn:
+            conn.execute(f'DELETE FROM response_cache WHERE tag IN ({placeholders})', tags)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM response_cache')
+
+
+class NullCache:
+    """Stand-in used when caching is turned off."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, tag, etag, body):
+        pass
+
+    def invalidate(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+
+def make_cache(path=None, maxsize=256, ttl=300):
+    if ttl <= 0:
+        return NullCache()
+    if path:
+        return SQLiteCache(path, maxsize=maxsize, ttl=ttl)
+    return MemoryCache(maxsize=maxsize, ttl=ttl)
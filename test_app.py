@@ -1,8 +1,32 @@
+import csv
+import io
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 import json
-from datetime import datetime
-from app import app
+import time
+from datetime import datetime, timezone
+
+# Always an in-memory database: clear_posts() deletes every row it can reach
+os.environ['DB_URL'] = 'sqlite://'
+# Tests drive jobs directly instead of through background worker threads
+os.environ['JOB_WORKERS'] = '0'
+
+from sqlalchemy import event
+
+from app import (app, db, Post, MonthlyStat, ScrapeJob, CrawlState, build_post, save_posts, invalidate_post_count,
+                 response_cache, post_snapshot, claim_next_job, run_scrape_job, enqueue_scrape_job,
+                 _active_job, _acquire_scheduler_lock, DeltaCrawl)
+from tiktok_client import TikTokClient
+from bloom import BloomFilter
+from benchmarks.stub_server import StubFeedHandler, start_stub_server, make_video
+from flask_migrate import upgrade, downgrade
+
+# The full-text index only exists through the migrations
+with app.app_context():
+    upgrade()
+
 
 class TestTikTokScraper(unittest.TestCase):
     def setUp(self):
@@ -14,7 +38,7 @@ class TestTikTokScraper(unittest.TestCase):
     def tearDown(self):
         self.app_context.pop()
     
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_all_posts_append(self, mock_get):
         sample_response = {
             "data": {
@@ -68,5 +92,602 @@ class TestTikTokScraper(unittest.TestCase):
        
         print("Test passed! The all_posts.append function works correctly!")
 
+
+class DatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.clear_posts()
+
+    def tearDown(self):
+        self.clear_posts()
+        self.app_context.pop()
+
+    def clear_posts(self):
+        db.session.execute(db.delete(Post))
+        db.session.execute(db.delete(MonthlyStat))
+        db.session.execute(db.delete(ScrapeJob))
+        db.session.execute(db.delete(CrawlState))
+        db.session.commit()
+        invalidate_post_count()
+        response_cache.clear()
+        post_snapshot.expire()
+
+    def make_posts(self, count, play_count=1000, create_time=1654321098, keyword="test"):
+        return [
+            build_post({"video_id": f"v{i}", "play_count": play_count, "comment_count": 10,
+                        "share_count": 5, "create_time": create_time}, keyword)
+            for i in range(count)
+        ]
+
+
+class TestSavePosts(DatabaseTestCase):
+
+    def test_bulk_insert_counts_and_statements(self):
+        save_posts(self.make_posts(50))
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            saved, skipped = save_posts(self.make_posts(200))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        self.assertEqual(saved, 150)
+        self.assertEqual(skipped, [f"v{i}" for i in range(50)])
+        self.assertEqual(db.session.scalar(db.select(db.func.count(Post.id))), 200)
+        # One INSERT ... RETURNING per chunk instead of a SELECT per row
+        self.assertLessEqual(len(statements), 4)
+
+    def test_concurrently_inserted_post_is_not_counted(self):
+        def insert_first(conn, cursor, statement, *args):
+            # Another writer stores v1 between our read and our INSERT
+            if statement.startswith('INSERT INTO post '):
+                conn.connection.driver_connection.execute(
+                    "INSERT INTO post (video_id, keyword) VALUES ('v1', 'other')")
+
+        event.listen(db.engine, 'before_cursor_execute', insert_first)
+        try:
+            saved, skipped = save_posts(self.make_posts(2, keyword="mine"))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', insert_first)
+
+        self.assertEqual(saved, 1)
+        self.assertEqual(skipped, ["v1"])
+        self.assertEqual(db.session.scalar(db.select(MonthlyStat.count).filter_by(keyword="mine")), 1)
+
+    def test_update_existing_refreshes_metrics(self):
+        save_posts(self.make_posts(3))
+        saved, skipped = save_posts(self.make_posts(3, play_count=5000), update_existing=True)
+
+        self.assertEqual(saved, 0)
+        self.assertEqual(len(skipped), 3)
+        post = db.session.scalar(db.select(Post).filter_by(video_id="v0"))
+        self.assertEqual(post.play_count, 5000)
+        self.assertEqual(post.engagement_rate, 0.3)
+        # 0.3% is below the shareable threshold the first save (1.5%) was above
+        self.assertFalse(post.is_shareable)
+
+
+class TestPostsPagination(DatabaseTestCase):
+    def test_cursor_mode_walks_every_post_once(self):
+        posts = self.make_posts(23)
+        for i, post in enumerate(posts):
+            # Several posts share a create_time and a few have none at all
+            post['create_time'] = datetime(2024, 1 + i % 3, 1) if i % 5 else None
+        save_posts(posts)
+
+        seen = []
+        after = ''
+        while after is not None:
+            data = self.client.get(f'/api/posts?per_page=4&after={after}').get_json()
+            seen.extend(post['video_id'] for post in data['results'])
+            self.assertEqual(data['pagination']['total'], 23)
+            after = data['pagination']['next_cursor']
+
+        self.assertEqual(len(seen), 23)
+        self.assertEqual(sorted(seen), sorted(post['video_id'] for post in posts))
+        dated = [
+            post.video_id for post in Post.query.filter(Post.create_time.isnot(None))
+            .order_by(Post.create_time.desc(), Post.id.desc())
+        ]
+        self.assertEqual(seen[:len(dated)], dated)
+
+        # Page mode lists the same order, undated posts last on every database
+        paged = []
+        for page in range(1, 8):
+            data = self.client.get(f'/api/posts?per_page=4&page={page}').get_json()
+            paged.extend(post['video_id'] for post in data['results'])
+            self.assertEqual(data['pagination']['has_next'], page < 6)
+        self.assertEqual(paged, seen)
+
+    def test_page_mode_and_bad_cursor(self):
+        save_posts(self.make_posts(15))
+
+        data = self.client.get('/api/posts?page=2&per_page=10').get_json()
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(data['pagination']['pages'], 2)
+        self.assertFalse(data['pagination']['has_next'])
+        self.assertTrue(data['pagination']['has_prev'])
+
+        response = self.client.get('/api/posts?after=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestMonthlyStats(DatabaseTestCase):
+    def test_rollup_follows_ingest_and_rebuild(self):
+        march = self.make_posts(3, create_time=datetime(2024, 3, 5).timestamp())
+        april = self.make_posts(5, create_time=datetime(2024, 4, 5).timestamp(), keyword="dance")
+        for post in april:
+            post['video_id'] += "-dance"
+        save_posts(march + april)
+        # Re-saving the same posts must not count them twice
+        save_posts(march)
+
+        self.assertEqual(self.client.get('/api/monthly-stats').get_json(),
+                         [{"date": "2024-03", "count": 3}, {"date": "2024-04", "count": 5}])
+        self.assertEqual(self.client.get('/api/monthly-stats?keyword=dance').get_json(),
+                         [{"date": "2024-04", "count": 5}])
+
+        runner = app.test_cli_runner()
+        self.assertEqual(runner.invoke(args=['rebuild-monthly-stats', '--check']).exit_code, 0)
+
+        db.session.execute(db.delete(MonthlyStat))
+        db.session.commit()
+        self.assertEqual(runner.invoke(args=['rebuild-monthly-stats', '--check']).exit_code, 1)
+        runner.invoke(args=['rebuild-monthly-stats'])
+        self.assertEqual(self.client.get('/api/monthly-stats?keyword=all').get_json(),
+                         [{"date": "2024-03", "count": 3}, {"date": "2024-04", "count": 5}])
+
+
+class TestResponseCache(DatabaseTestCase):
+    def test_etag_and_invalidation_on_save(self):
+        save_posts(self.make_posts(2))
+
+        first = self.client.get('/api/keywords')
+        self.assertEqual(first.get_json(), ["test"])
+        etag = first.headers['ETag']
+
+        cached = self.client.get('/api/keywords', headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+
+        new_posts = self.make_posts(1, keyword="dance")
+        new_posts[0]['video_id'] = "dance-1"
+        save_posts(new_posts)
+
+        fresh = self.client.get('/api/keywords', headers={'If-None-Match': etag})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.get_json(), ["dance", "test"])
+        self.assertNotEqual(fresh.headers['ETag'], etag)
+
+
+class RateLimitedFeedHandler(StubFeedHandler):
+    latency = 0
+
+    def do_GET(self):
+        # Every page after the first stays rate limited
+        if 'cursor=0' in self.path:
+            return super().do_GET()
+        body = b'{"message": "Too many requests"}'
+        self.send_response(429)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServerTestCase(DatabaseTestCase):
+    # Points the app's TikTok client at a local StubFeedHandler server
+    def setUp(self):
+        super().setUp()
+        self.server, base_url = start_stub_server()
+        app.extensions['tiktok_client'] = TikTokClient(base_url, max_workers=2, rate_limit=0)
+
+    def tearDown(self):
+        app.extensions.pop('tiktok_client', None)
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+
+class TestStreamingScrape(StubServerTestCase):
+    def test_stream_yields_posts_then_summary(self):
+        save_posts([build_post({"video_id": "0-0"}, "test")])
+
+        response = self.client.get('/api/scrap-tiktok-data?keyword=test&limit=5&max_posts=12'
+                                   '&is_save_to_db=1&stream=1')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+        # Pages are whole, so 12 requested posts means three pages of five
+        posts, summary = lines[:-1], lines[-1]['summary']
+        self.assertEqual([post['video_id'] for post in posts],
+                         [f"{cursor}-{i}" for cursor in range(3) for i in range(5)])
+        self.assertEqual(summary['saved_posts'], 14)
+        self.assertEqual(summary['skipped_video_ids'], ["0-0"])
+        self.assertEqual(db.session.scalar(db.select(db.func.count(Post.id))), 15)
+
+    def test_stream_reports_upstream_failure(self):
+        self.server.RequestHandlerClass = RateLimitedFeedHandler
+        app.extensions['tiktok_client'].max_retries = 0
+
+        response = self.client.get('/api/scrap-tiktok-data?keyword=test&limit=5&max_posts=30'
+                                   '&is_save_to_db=1&stream=1')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(lines[-2], {"error": "Failed to fetch data from the API"})
+        self.assertEqual(lines[-1]['summary']['saved_posts'], 5)
+
+
+class TestScrapeFlags(StubServerTestCase):
+    # Flags are off unless given a truthy value, not just any non-empty string
+    url = '/api/scrap-tiktok-data?keyword=test&limit=5&max_posts=5'
+
+    def test_stream_off(self):
+        for value in ('0', 'false'):
+            response = self.client.get(f'{self.url}&stream={value}')
+            self.assertEqual(response.mimetype, 'application/json')
+
+    def test_delta_off(self):
+        for value in ('0', 'false'):
+            data = self.client.get(f'{self.url}&is_save_to_db=1&delta={value}').get_json()
+            self.assertNotIn('delta', data)
+        self.assertIsNone(db.session.get(CrawlState, 'test'))
+
+    def test_save_and_update_existing_off(self):
+        stored = build_post(make_video(0, 0), "test")
+        stored['play_count'] = 1
+        save_posts([stored])
+
+        self.client.get(f'{self.url}&is_save_to_db=false')
+        self.assertEqual(db.session.scalar(db.select(db.func.count(Post.id))), 1)
+        for value in ('0', 'false'):
+            self.client.get(f'{self.url}&is_save_to_db=1&update_existing={value}')
+        db.session.expire_all()
+        self.assertEqual(db.session.scalar(db.select(Post.play_count).filter_by(video_id="0-0")), 1)
+
+
+class TestDeltaCrawl(StubServerTestCase):
+    def test_second_crawl_stops_at_first_known_page(self):
+        url = '/api/scrap-tiktok-data?keyword=test&limit=5&max_posts=30&is_save_to_db=1&delta=1'
+        first = self.client.get(url).get_json()
+        self.assertEqual(first['saved_posts'], 30)
+        self.assertEqual(first['delta']['pages_fetched'], 6)
+        self.assertFalse(first['delta']['stopped_early'])
+
+        second = self.client.get(url).get_json()
+        self.assertEqual(second['results'], [])
+        self.assertEqual(second['delta']['pages_fetched'], 1)
+        self.assertEqual(second['delta']['known_posts_filtered'], 5)
+        self.assertEqual(second['delta']['upstream_calls_avoided'], 5)
+
+        state = db.session.get(CrawlState, 'test')
+        self.assertEqual(state.last_cursor, 0)
+        seen = BloomFilter.from_bytes(state.seen_video_ids)
+        self.assertIn("5-4", seen)
+        self.assertNotIn("9-9", seen)
+
+    def test_mostly_known_pages_stay_within_the_page_budget(self):
+        class LongFeedHandler(StubFeedHandler):
+            pages = 40
+            latency = 0
+            calls = []
+
+            def do_GET(self):
+                self.calls.append(self.path)
+                super().do_GET()
+
+        self.server.RequestHandlerClass = LongFeedHandler
+        # Four of every five videos on each page are already stored and remembered
+        known = [build_post(make_video(cursor, i), "test") for cursor in range(40) for i in range(1, 5)]
+        save_posts(known)
+        DeltaCrawl("test", 5, 200).record(known)
+
+        data = self.client.get('/api/scrap-tiktok-data?keyword=test&limit=5&max_posts=10'
+                               '&is_save_to_db=1&delta=1').get_json()
+        self.assertEqual(len(LongFeedHandler.calls), 2)
+        self.assertEqual([post['video_id'] for post in data['results']], ["0-0", "1-0"])
+        self.assertEqual(data['delta']['pages_fetched'], 2)
+        self.assertEqual(data['delta']['known_posts_filtered'], 8)
+
+    def test_filter_hit_without_stored_post_is_saved(self):
+        # Stands in for a bloom filter false positive: remembered but never stored
+        DeltaCrawl("test", 5, 10).record([build_post(make_video(0, i), "test") for i in range(5)])
+
+        data = self.client.get('/api/scrap-tiktok-data?keyword=test&limit=5&max_posts=10'
+                               '&is_save_to_db=1&delta=1').get_json()
+        self.assertEqual(data['saved_posts'], 10)
+        self.assertEqual(data['delta']['known_posts_filtered'], 0)
+        self.assertFalse(data['delta']['stopped_early'])
+        self.assertIsNotNone(db.session.scalar(db.select(Post).filter_by(video_id="0-0")))
+
+    def test_crawl_without_saving_leaves_state_alone(self):
+        self.client.get('/api/scrap-tiktok-data?keyword=test&limit=5&max_posts=10&is_save_to_db=1&delta=1')
+        before = db.session.get(CrawlState, 'test').seen_video_ids
+
+        job_id = self.client.post('/api/jobs', json={"keyword": "test", "limit": 5, "max_posts": 30,
+                                                     "delta": True}).get_json()['job']['id']
+        run_scrape_job(claim_next_job())
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}').get_json()['status'], 'done')
+
+        # The job stopped at the known page 0, but only saving crawls move last_cursor
+        db.session.expire_all()
+        state = db.session.get(CrawlState, 'test')
+        self.assertEqual(state.last_cursor, 1)
+        self.assertEqual(state.seen_video_ids, before)
+
+
+class TestScrapeJobs(StubServerTestCase):
+    def test_job_lifecycle_and_keyword_dedup(self):
+        response = self.client.post('/api/jobs', json={"keyword": "test", "limit": 5, "max_posts": 30,
+                                                        "is_save_to_db": True})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job']['id']
+
+        duplicate = self.client.post('/api/jobs', json={"keyword": "test"})
+        self.assertEqual(duplicate.status_code, 200)
+        self.assertTrue(duplicate.get_json()['deduplicated'])
+        self.assertEqual(duplicate.get_json()['job']['id'], job_id)
+
+        self.assertEqual(claim_next_job(), job_id)
+        # Claimed jobs aren't handed out twice
+        self.assertIsNone(claim_next_job())
+        run_scrape_job(job_id)
+
+        status = self.client.get(f'/api/jobs/{job_id}').get_json()
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['pages_fetched'], 6)
+        self.assertEqual(status['posts_saved'], 30)
+        self.assertEqual(status['errors'], [])
+        self.assertEqual(self.client.get('/api/jobs/999999').status_code, 404)
+        self.assertEqual(self.client.post('/api/jobs', json={}).status_code, 400)
+
+    def test_stale_job_restarts_with_fresh_progress(self):
+        job, _ = enqueue_scrape_job("test", limit=5, max_posts=30, save_to_db=True)
+        self.assertEqual(claim_next_job(), job.id)
+        # The worker died after three pages
+        job.pages_fetched, job.posts_fetched, job.posts_saved = 3, 15, 15
+        job.updated_at = datetime(2020, 1, 1)
+        db.session.commit()
+
+        self.assertEqual(claim_next_job(), job.id)
+        db.session.refresh(job)
+        self.assertEqual((job.pages_fetched, job.posts_fetched, job.posts_saved), (0, 0, 0))
+        self.assertEqual(len(job.errors), 1)
+        self.assertIn("stopped after 3 pages (15 posts saved)", job.errors[0])
+
+        run_scrape_job(job.id)
+        status = self.client.get(f'/api/jobs/{job.id}').get_json()
+        self.assertEqual((status['status'], status['pages_fetched'], status['posts_fetched']), ('done', 6, 30))
+        self.assertEqual(len(status['errors']), 1)
+
+    def test_concurrent_enqueue_keeps_one_active_job(self):
+        other, _ = enqueue_scrape_job("test")
+        # Our existence check runs before the other process commits its job
+        results = [None]
+        with patch('app._active_job', side_effect=lambda keyword: results.pop() if results else _active_job(keyword)):
+            job, created = enqueue_scrape_job("test")
+        self.assertFalse(created)
+        self.assertEqual(job.id, other.id)
+
+        # Finished jobs don't block a new one
+        other.status = 'done'
+        db.session.commit()
+        self.assertTrue(enqueue_scrape_job("test")[1])
+
+    def test_one_process_holds_the_scheduler_lock(self):
+        lock_path = app.config['RECRAWL_LOCK_PATH']
+        with tempfile.TemporaryDirectory() as directory:
+            app.config['RECRAWL_LOCK_PATH'] = os.path.join(directory, 'recrawl.lock')
+            try:
+                first = _acquire_scheduler_lock()
+                self.assertIsNotNone(first)
+                self.assertIsNone(_acquire_scheduler_lock())
+                # The next process gets the lock once the holder exits
+                first.close()
+                second = _acquire_scheduler_lock()
+                self.assertIsNotNone(second)
+                second.close()
+            finally:
+                app.config['RECRAWL_LOCK_PATH'] = lock_path
+
+    def test_rate_limited_page_fails_the_scrape(self):
+        self.server.RequestHandlerClass = RateLimitedFeedHandler
+        app.extensions['tiktok_client'].max_retries = 1
+        app.extensions['tiktok_client'].backoff = 0.01
+
+        response = self.client.get('/api/scrap-tiktok-data?keyword=test&limit=5&max_posts=30')
+        self.assertEqual(response.status_code, 502)
+
+        job_id = self.client.post('/api/jobs', json={"keyword": "test", "limit": 5, "max_posts": 30,
+                                                     "is_save_to_db": True}).get_json()['job']['id']
+        run_scrape_job(claim_next_job())
+        status = self.client.get(f'/api/jobs/{job_id}').get_json()
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(status['posts_saved'], 5)
+        self.assertIn('429', status['errors'][0])
+
+
+class TestPostSearch(DatabaseTestCase):
+    def test_full_text_and_filters(self):
+        titles = ["Funny cat video", "Cat food review", "Dog training tips", "cats & dogs: friends?"]
+        posts = self.make_posts(len(titles))
+        for post, title in zip(posts, titles):
+            post['title'] = title
+        posts[1]['user_unique_id'] = "chef"
+        posts[2]['region'] = "GB"
+        save_posts(posts)
+
+        def search(query):
+            data = self.client.get(f'/api/posts?{query}').get_json()
+            return sorted(post['video_id'] for post in data['results']), data['pagination']['total']
+
+        self.assertEqual(search('q=cat'), (["v0", "v1"], 2))
+        self.assertEqual(search('q=CAT%20review'), (["v1"], 1))
+        # Punctuation in the query must not reach the FTS syntax
+        self.assertEqual(search('q=dogs%3A%20"friends'), (["v3"], 1))
+        self.assertEqual(search('q=cat&creator=chef'), (["v1"], 1))
+        self.assertEqual(search('region=GB&after='), (["v2"], 1))
+        self.assertEqual(search('keyword=other'), ([], 0))
+
+        # Title changes reach the index through the triggers
+        db.session.execute(db.update(Post).where(Post.video_id == "v2").values(title="Cat training"))
+        db.session.commit()
+        response_cache.clear()
+        self.assertEqual(search('q=cat')[0], ["v0", "v1", "v2"])
+
+    def test_search_without_migrations_falls_back_to_like(self):
+        save_posts([build_post({"video_id": "v0", "title": "Funny cat video"}, "test"),
+                    build_post({"video_id": "v1", "title": "Dog training tips"}, "test")])
+        downgrade(revision='base')
+        try:
+            response = self.client.get('/api/posts?q=cat')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([post['video_id'] for post in response.get_json()['results']], ["v0"])
+            export = self.client.get('/api/posts/export?format=ndjson&q=cat').get_data(as_text=True)
+            self.assertEqual([json.loads(line)['video_id'] for line in export.splitlines()], ["v0"])
+        finally:
+            upgrade()
+
+
+class TestExport(DatabaseTestCase):
+    def test_csv_and_ndjson_with_filters(self):
+        posts = self.make_posts(5, create_time=datetime(2024, 5, 20, tzinfo=timezone.utc).timestamp())
+        posts += [build_post({"video_id": f"old-{i}", "play_count": 10, "create_time": datetime(2023, 1, 1).timestamp()},
+                             "test") for i in range(3)]
+        posts[0]['keyword'] = "other"
+        save_posts(posts)
+
+        response = self.client.get('/api/posts/export?keyword=test&start=2024-05-01&end=2024-05-20')
+        self.assertEqual(response.mimetype, 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual([row['video_id'] for row in rows], ["v1", "v2", "v3", "v4"])
+        self.assertEqual(rows[0]['create_time'], "2024-05-20T00:00:00")
+
+        response = self.client.get('/api/posts/export?format=ndjson&shareable=false')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(sorted(line['video_id'] for line in lines), ["old-0", "old-1", "old-2"])
+
+        self.assertEqual(self.client.get('/api/posts/export?start=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/api/posts/export?format=xml').status_code, 400)
+
+
+class TestAnalytics(DatabaseTestCase):
+    def make_creator_posts(self, keyword, creator, play_counts, month):
+        return [
+            build_post({"video_id": f"{keyword}-{creator}-{i}", "play_count": plays, "comment_count": 10,
+                        "share_count": 10, "create_time": datetime(2024, month, 10).timestamp(),
+                        "author": {"unique_id": creator, "nickname": creator.title()}}, keyword)
+            for i, plays in enumerate(play_counts)
+        ]
+
+    def test_engagement_top_and_trends(self):
+        save_posts(self.make_creator_posts("cats", "anna", [1000, 2000, 4000, 8000], 1)
+                   + self.make_creator_posts("dogs", "ben", [200000, 500], 2))
+
+        by_keyword = {row['keyword']: row for row in self.client.get('/api/analytics/engagement').get_json()}
+        self.assertEqual(by_keyword['cats']['posts'], 4)
+        self.assertAlmostEqual(by_keyword['cats']['p50'], (1.0 + 0.5) / 2, places=2)
+
+        by_creator = self.client.get('/api/analytics/engagement?by=creator&keyword=dogs').get_json()
+        self.assertEqual([(row['user_unique_id'], row['user_nickname']) for row in by_creator], [("ben", "Ben")])
+        self.assertEqual(self.client.get('/api/analytics/engagement?by=region').status_code, 400)
+
+        top = self.client.get('/api/analytics/top-shareable?n=2').get_json()
+        self.assertEqual([post['video_id'] for post in top], ["dogs-ben-1", "cats-anna-0"])
+
+        # New posts are picked up incrementally
+        save_posts(self.make_creator_posts("cats", "cleo", [100, 100], 2))
+        trends = self.client.get('/api/analytics/trends?keyword=cats').get_json()
+        self.assertEqual([(row['period'], row['posts']) for row in trends], [("2024-01", 4), ("2024-02", 2)])
+        self.assertEqual(trends[1]['posts_growth'], -50.0)
+        self.assertIsNone(trends[0]['posts_growth'])
+
+    def test_updated_and_new_posts_are_loaded_once(self):
+        save_posts(self.make_creator_posts("cats", "anna", [1000], 1))
+        self.client.get('/api/analytics/engagement')
+        save_posts(self.make_creator_posts("cats", "anna", [2000, 4000], 1), update_existing=True)
+
+        by_keyword = self.client.get('/api/analytics/engagement').get_json()
+        self.assertEqual(by_keyword[0]['posts'], 2)
+        self.assertEqual(sorted(post_snapshot.frame['id']), sorted(post.id for post in Post.query))
+
+
+class TestMetrics(DatabaseTestCase):
+    def test_metrics_and_slow_request_log(self):
+        save_posts(self.make_posts(3))
+        app.config['SLOW_REQUEST_MS'] = 0.001
+        try:
+            with self.assertLogs(app.logger, 'WARNING') as logs:
+                self.client.get('/api/posts?keyword=test')
+        finally:
+            app.config['SLOW_REQUEST_MS'] = 1000
+        self.assertIn('Slow request GET /api/posts?keyword=test', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+        body = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertRegex(body, r'http_request_duration_seconds_count\{endpoint="/api/posts",method="GET",status="200"\} \d+')
+        self.assertRegex(body, r'http_request_sql_statements_sum\{endpoint="/api/posts"\} [1-9]')
+        self.assertRegex(body, r'sql_statements_total [1-9]')
+
+
+class TestTikTokClient(unittest.TestCase):
+    def setUp(self):
+        self.server, self.base_url = start_stub_server()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def collect(self, client, prefetch):
+        video_ids = []
+        for cursor, post_data in client.iter_pages('test', 5, prefetch=prefetch):
+            video_ids.extend(v['video_id'] for v in post_data['data']['videos'])
+        return video_ids
+
+    def test_prefetch_is_faster_and_keeps_order(self):
+        client = TikTokClient(self.base_url, max_workers=4, rate_limit=0)
+
+        start = time.perf_counter()
+        sequential = self.collect(client, prefetch=0)
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = self.collect(client, prefetch=4)
+        concurrent_time = time.perf_counter() - start
+
+        expected = [f"{cursor}-{i}" for cursor in range(6) for i in range(5)]
+        self.assertEqual(sequential, expected)
+        self.assertEqual(concurrent, expected)
+        self.assertLess(concurrent_time, sequential_time / 2)
+
+    def test_retries_rate_limited_pages(self):
+        class FlakyFeedHandler(StubFeedHandler):
+            latency = 0
+            calls = []
+
+            def do_GET(self):
+                # The first request is rate limited
+                self.calls.append(self.path)
+                if len(self.calls) == 1:
+                    self.send_response(429)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                super().do_GET()
+
+        self.server.RequestHandlerClass = FlakyFeedHandler
+        attempts, retries = [], []
+        client = TikTokClient(self.base_url, rate_limit=0, backoff=0.01,
+                              on_request=lambda seconds, status: attempts.append(status),
+                              on_retry=retries.append)
+
+        post_data = client.fetch_page('test', 5, 0)
+        self.assertEqual(len(post_data['data']['videos']), 5)
+        self.assertEqual(attempts, [429, 200])
+        self.assertEqual(retries, [429])
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,157 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Status codes worth retrying: rate limited or a transient upstream failure.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """The API couldn't be reached, or answered with an error status after all retries."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # A rate of 0 (or less) turns rate limiting off
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class TikTokClient:
+    """Fetches /feed/search pages over one keep-alive session.
+
+    Upcoming cursor pages are requested on a small worker pool while the
+    caller is still busy with the current one, every request goes through a
+    token bucket, and 429/5xx responses are retried with exponential backoff.
+
+    ``on_request(seconds, status)`` is called after every HTTP attempt (status
+    is ``'error'`` when no response came back) and ``on_retry(status)`` before
+    each retry, e.g. to feed metrics.
+    """
+
+    def __init__(self, base_url, api_key=None, api_host=None, max_workers=4,
+                 rate_limit=5, max_retries=3, backoff=0.5, timeout=30,
+                 on_request=None, on_retry=None):
+        self.base_url = base_url.rstrip('/')
+        self.on_request = on_request
+        self.on_retry = on_retry
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate_limit)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'x-rapidapi-key': api_key or '',
+            'x-rapidapi-host': api_host or '',
+        })
+
+    def fetch_page(self, keyword, count, cursor, publish_time=0, sort=0):
+        """Fetch one cursor page and return the decoded JSON body.
+
+        Raises :class:`UpstreamError` when the request fails or still gets an
+        error status once retries are exhausted, and ``ValueError`` when the
+        body is not valid JSON.
+        """
+        params = {
+            'keywords': keyword,
+            'count': count,
+            'cursor': cursor,
+            'publish_time': publish_time,
+            'sort_type': sort,
+        }
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.get(f'{self.base_url}/feed/search', params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                if self.on_request:
+                    self.on_request(time.perf_counter() - started, 'error')
+                raise UpstreamError(f"Request for cursor {cursor} failed: {e}") from e
+            if self.on_request:
+                self.on_request(time.perf_counter() - started, response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                break
+            if self.on_retry:
+                self.on_retry(response.status_code)
+            delay = self.backoff * (2 ** attempt)
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            print(f"Upstream returned {response.status_code} for cursor {cursor}, retrying in {delay}s")
+            time.sleep(delay)
+            attempt += 1
+
+        if not response.ok:
+            raise UpstreamError(f"Upstream returned {response.status_code} for cursor {cursor}")
+        try:
+            return response.json()
+        except Exception as e:
+            raise ValueError(f"Failed to parse API response: {e}") from e
+
+    def iter_pages(self, keyword, count, publish_time=0, sort=0, max_pages=None, prefetch=None):
+        """Yield ``(cursor, post_data)`` for consecutive cursor pages, in order.
+
+        Up to ``prefetch`` pages beyond the current one are already in flight
+        while the caller processes it.  Iteration stops on an empty page, when
+        ``hasMore`` is false, or after ``max_pages`` pages; closing the
+        generator early cancels any pages that have not been sent yet.
+        """
+        if prefetch is None:
+            prefetch = self.max_workers
+        window = max(1, prefetch + 1)
+        pending = {}
+        next_cursor = 0
+
+        def schedule(executor):
+            nonlocal next_cursor
+            while len(pending) < window and (max_pages is None or next_cursor < max_pages):
+                pending[next_cursor] = executor.submit(
+                    self.fetch_page, keyword, count, next_cursor, publish_time, sort
+                )
+                next_cursor += 1
+
+        executor = ThreadPoolExecutor(max_workers=min(window, self.max_workers))
+        try:
+            cursor = 0
+            while max_pages is None or cursor < max_pages:
+                schedule(executor)
+                post_data = pending.pop(cursor).result()
+                yield cursor, post_data
+
+                data = post_data.get('data', {}) or {}
+                if not data.get('videos') or not data.get('hasMore', False):
+                    break
+                cursor += 1
+        finally:
+            for future in pending.values():
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)